@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from ContextualInformationContent import ContextualInformationContentCalculator
+from IIC import improved_information_content_algorithm
+from MultiDimensionalInformationContent import MultiDimICCalculator
+from PetriNetModel import build_native_petri_net
+from ProcessDiscovery import infer_relationships
+from SyntheticLogGenerator import generate_xes_log
+from TemporalInformationContent import TemporalInformationContentCalculator
+from UncertaintyInformationContent import UncertaintyICCalculator
+from XESParser import XESParser
+
+DEFAULT_SIZES = [10 ** exponent for exponent in range(2, 7)]
+
+
+def parse_stage(state):
+    state['event_log'] = XESParser(state['data_dir']).process_all_xes_files(max_traces=state['n_traces'])
+
+
+def temporal_stage(state):
+    calculator = TemporalInformationContentCalculator()
+    state['IC_Temporal'] = calculator.calculate_temporal_information_content(state['event_log'], state['lambda_val'])
+
+
+def contextual_stage(state):
+    calculator = ContextualInformationContentCalculator(state['event_log'], state['lambda_val'])
+    state['IC_Contextual'] = calculator.calculate_contextual_information_content()
+
+
+def multidim_stage(state):
+    state['IC_MultiDim'] = MultiDimICCalculator(state['event_log']).calculate()
+
+
+def uncertainty_stage(state):
+    state['IC_Uncertainty'] = UncertaintyICCalculator(state['event_log']).calculate()
+
+
+def iic_stage(state):
+    state['parsed_log'] = improved_information_content_algorithm(
+        state['event_log'], state['IC_Temporal'], state['IC_Contextual'], state['IC_MultiDim'], state['IC_Uncertainty'])
+
+
+def inference_stage(state):
+    state['inferred_relationships'] = infer_relationships(state['parsed_log'])
+
+
+def petri_net_stage(state):
+    state['petri_net'] = build_native_petri_net(state['inferred_relationships'])
+
+
+STAGES = [
+    ('parse', parse_stage),
+    ('temporal_ic', temporal_stage),
+    ('contextual_ic', contextual_stage),
+    ('multidim_ic', multidim_stage),
+    ('uncertainty_ic', uncertainty_stage),
+    ('iic', iic_stage),
+    ('relationship_inference', inference_stage),
+    ('petri_net', petri_net_stage),
+]
+
+
+def run_stage(stage, state, profile_memory):
+    """Run one stage, returning (seconds, peak traced bytes or None).
+
+    The stage is timed without tracing; when profile_memory is set it is run a
+    second time under tracemalloc, as tracing slows allocation-heavy code down.
+    Stages only add keys to the state and treat the values already in it as
+    read-only, so the second run gets a shallow copy taken before the first:
+    it sees the same inputs without paying for a copy of the parsed log.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        traced_state = dict(state)
+        started = time.perf_counter()
+        stage(state)
+        seconds = time.perf_counter() - started
+        if not profile_memory:
+            return seconds, None
+        tracemalloc.start()
+        try:
+            stage(traced_state)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return seconds, peak
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'run_id': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, output_path='benchmark_results.jsonl', data_dir='./.bench_data',
+                  lambda_val=0.5, profile_memory=True, stages=None, **log_options):
+    """Time and memory-profile every pipeline stage on synthetic logs of increasing size.
+
+    Each size gets its own synthetic log, generated once and reused by later runs
+    with the same parameters. Stages run in pipeline order, each consuming the
+    outputs of the previous ones. A stage that raises is recorded with status
+    'error' and the run goes on; stages needing a missing module are 'skipped'.
+    One JSON record per (size, stage) is appended to output_path, so successive
+    runs build up a history for tracking regressions and scaling curves.
+
+    Args:
+        sizes (list): Numbers of traces to benchmark.
+        output_path (str): JSON Lines file the records are appended to.
+        data_dir (str): Directory holding the generated logs.
+        lambda_val (float): Scaling factor of the temporal and contextual IC.
+        profile_memory (bool): Also measure the peak traced memory of every stage.
+        stages (list): Names of the stages to report, all of them by default. Earlier
+            stages still run when later ones need their outputs.
+        **log_options: Options of SyntheticLogGenerator.generate_xes_log (trace_length, ...).
+
+    Returns:
+        list: The records written.
+    """
+    metadata = run_metadata()
+    records = []
+    for n_traces in sizes:
+        log_parameters = dict(log_options, n_traces=n_traces)
+        log_parameters.setdefault('seed', 0)
+        name = '-'.join(f'{key}{value}' for key, value in sorted(log_parameters.items()))
+        size_dir = os.path.join(data_dir, name)
+        log_path = os.path.join(size_dir, 'log.xes')
+        if not os.path.exists(log_path):
+            os.makedirs(size_dir, exist_ok=True)
+            generate_xes_log(log_path + '.partial', **log_parameters)
+            os.replace(log_path + '.partial', log_path)
+        state = {'data_dir': size_dir, 'n_traces': n_traces, 'lambda_val': lambda_val}
+        for stage_name, stage in STAGES:
+            record = dict(metadata, stage=stage_name, log=log_parameters)
+            try:
+                seconds, peak = run_stage(stage, state, profile_memory)
+                record.update(status='ok', seconds=seconds, peak_bytes=peak)
+            except ImportError as error:
+                record.update(status='skipped', reason=str(error))
+            except Exception as error:
+                record.update(status='error', reason=f"{type(error).__name__}: {error}")
+            if stage_name == 'parse' and 'event_log' in state:
+                log_parameters['n_events'] = sum(len(trace) for trace in state['event_log'])
+            if stages is None or stage_name in stages:
+                records.append(record)
+                with open(output_path, 'a') as output:
+                    output.write(json.dumps(record) + '\n')
+                print(f"{n_traces:>9} traces  {stage_name:<24} {record['status']:<8}"
+                      f"{record.get('seconds', 0):10.3f} s" +
+                      (f"{record['peak_bytes'] / 2 ** 20:10.1f} MiB" if record.get('peak_bytes') is not None else ''))
+    return records
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic XES logs.")
+    argument_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="numbers of traces")
+    argument_parser.add_argument('--output', default='benchmark_results.jsonl')
+    argument_parser.add_argument('--data-dir', default='./.bench_data')
+    argument_parser.add_argument('--stages', nargs='+', choices=[name for name, _ in STAGES])
+    argument_parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+    argument_parser.add_argument('--trace-length', type=int, default=10)
+    argument_parser.add_argument('--activities', type=int, default=20)
+    argument_parser.add_argument('--attributes', type=int, default=2)
+    argument_parser.add_argument('--variants', type=int, default=100)
+    argument_parser.add_argument('--skew', type=float, default=1.0)
+    arguments = argument_parser.parse_args()
+    run_benchmark(arguments.sizes, arguments.output, arguments.data_dir, profile_memory=not arguments.no_memory,
+                  stages=arguments.stages, trace_length=arguments.trace_length, n_activities=arguments.activities,
+                  n_attributes=arguments.attributes, n_variants=arguments.variants, variant_skew=arguments.skew)
@@ -0,0 +1,155 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+MISSING_TIMESTAMP = np.iinfo(np.int64).min
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class ColumnarEventLog:
+    """Integer-encoded, column-oriented event log.
+
+    Events of all traces are laid out back to back; trace i spans the events
+    trace_offsets[i]:trace_offsets[i + 1]. Activities are stored as ids from
+    activity_to_id, timestamps as int64 microseconds since the epoch (UTC for
+    timezone-aware values), and every other attribute is dictionary-encoded
+    as int32 codes into a per-key list of values, -1 marking a missing value.
+
+    Attributes:
+        activity_to_id (dict): Activity name to activity id.
+        activities (list): Activity id to activity name.
+        activity_ids (numpy.ndarray): int32 activity id of every event.
+        timestamps (numpy.ndarray): int64 timestamp of every event, MISSING_TIMESTAMP if absent.
+        trace_offsets (numpy.ndarray): int64 offsets of the first event of every trace, plus the end.
+        attributes (dict): Attribute key to (int32 codes, list of values).
+    """
+
+    def __init__(self, activity_to_id, activity_ids, timestamps, trace_offsets, attributes):
+        self.activity_to_id = activity_to_id
+        self.activities = [None] * len(activity_to_id)
+        for activity, activity_id in activity_to_id.items():
+            self.activities[activity_id] = activity
+        self.activity_ids = activity_ids
+        self.timestamps = timestamps
+        self.trace_offsets = trace_offsets
+        self.attributes = attributes
+
+    @classmethod
+    def from_traces(cls, traces, activity_to_id=None):
+        """Encode traces of event dictionaries in a single pass.
+
+        Args:
+            traces (iterable): Traces as lists of event dictionaries, e.g. the output of
+                XESParser.process_all_xes_files or XESParser.iter_all_xes_files.
+            activity_to_id (dict): Existing activity mapping, such as XESParser.activity_to_id.
+                It is extended in place with activities it does not know yet.
+
+        Returns:
+            ColumnarEventLog: The encoded log.
+        """
+        activity_to_id = {} if activity_to_id is None else activity_to_id
+        activity_ids = array('i')
+        timestamps = array('q')
+        trace_offsets = array('q', [0])
+        codes = {}
+        dictionaries = {}
+
+        for trace in traces:
+            for event in trace:
+                position = len(activity_ids)
+                activity = event['concept:name']
+                activity_id = activity_to_id.get(activity)
+                if activity_id is None:
+                    activity_id = activity_to_id[activity] = len(activity_to_id)
+                activity_ids.append(activity_id)
+                timestamps.append(encode_timestamp(event.get('time:timestamp')))
+                for key, value in event.items():
+                    if key == 'concept:name' or key == 'time:timestamp':
+                        continue
+                    column = codes.get(key)
+                    if column is None:
+                        column = codes[key] = array('i', [-1]) * position
+                        dictionaries[key] = {}
+                    elif len(column) < position:
+                        column.extend(array('i', [-1]) * (position - len(column)))
+                    dictionary = dictionaries[key]
+                    code = dictionary.get(value)
+                    if code is None:
+                        code = dictionary[value] = len(dictionary)
+                    column.append(code)
+            trace_offsets.append(len(activity_ids))
+
+        event_count = len(activity_ids)
+        attributes = {}
+        for key, column in codes.items():
+            if len(column) < event_count:
+                column.extend(array('i', [-1]) * (event_count - len(column)))
+            attributes[key] = (np.frombuffer(column, dtype=np.int32), list(dictionaries[key]))
+        return cls(
+            activity_to_id,
+            np.frombuffer(activity_ids, dtype=np.int32),
+            np.frombuffer(timestamps, dtype=np.int64),
+            np.frombuffer(trace_offsets, dtype=np.int64),
+            attributes,
+        )
+
+    @property
+    def n_traces(self):
+        return len(self.trace_offsets) - 1
+
+    @property
+    def n_events(self):
+        return len(self.activity_ids)
+
+    def trace_lengths(self):
+        """Return the number of events of every trace."""
+        return np.diff(self.trace_offsets)
+
+    def trace_index(self):
+        """Return the index of the trace each event belongs to."""
+        return np.repeat(np.arange(self.n_traces), self.trace_lengths())
+
+    def trace_activity_ids(self, trace):
+        """Return the activity ids of one trace."""
+        return self.activity_ids[self.trace_offsets[trace]:self.trace_offsets[trace + 1]]
+
+    def activity_counts(self):
+        """Return the number of occurrences of every activity id."""
+        return np.bincount(self.activity_ids, minlength=len(self.activities))
+
+    def activities_in_order(self):
+        """Return the ids of the activities present in the log, in order of first appearance."""
+        present, first_positions = np.unique(self.activity_ids, return_index=True)
+        return present[np.argsort(first_positions, kind='stable')]
+
+    def attribute_codes(self, key):
+        """Return (codes, values) for an attribute key, all codes -1 if the key never occurs."""
+        if key in self.attributes:
+            return self.attributes[key]
+        return np.full(self.n_events, -1, dtype=np.int32), []
+
+    def head(self, n_traces):
+        """Return a log restricted to the first n_traces traces, sharing this log's arrays."""
+        n_traces = min(n_traces, self.n_traces)
+        end = int(self.trace_offsets[n_traces])
+        attributes = {key: (codes[:end], values) for key, (codes, values) in self.attributes.items()}
+        return ColumnarEventLog(self.activity_to_id, self.activity_ids[:end], self.timestamps[:end],
+                                self.trace_offsets[:n_traces + 1], attributes)
+
+    def nbytes(self):
+        """Return the memory held by the log's arrays, in bytes."""
+        arrays = [self.activity_ids, self.timestamps, self.trace_offsets]
+        arrays.extend(codes for codes, _ in self.attributes.values())
+        return sum(column.nbytes for column in arrays)
+
+
+def encode_timestamp(value):
+    """Encode a datetime as int64 microseconds since the epoch."""
+    if value is None:
+        return MISSING_TIMESTAMP
+    if value.tzinfo is None:
+        return (value - EPOCH) // MICROSECOND
+    return (value - EPOCH_UTC) // MICROSECOND
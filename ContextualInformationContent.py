@@ -1,22 +1,59 @@
+import math
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from ColumnarEventLog import ColumnarEventLog
+from Instrumentation import metrics
+
+
 class ContextualInformationContentCalculator:
+    broader_context_keys = ['lifecycle:transition', 'org:group']
+
     def __init__(self, event_log, lambda_val):
-        self.event_log = event_log[:5000]  # Limit the event log to the first 5000 traces
+        self.event_log = event_log
         self.lambda_val = lambda_val
-        self.context_data = self.extract_contextual_data()
+        # Contingency index filled in a single pass: context tuple -> activity -> count, and context tuple -> count
+        self.context_counts = defaultdict(Counter)
+        self.context_totals = Counter()
+        # event_log=None leaves the statistics to be filled in by the caller (e.g. FusedICEngine)
+        self.context_data = self.extract_contextual_data() if event_log is not None else {}
 
+    @metrics.timed('contextual_ic')
     def extract_contextual_data(self):
+        if isinstance(self.event_log, ColumnarEventLog):
+            return self.extract_contextual_data_columnar()
+        # The context of an activity is the one of its last occurrence
+        metrics.progress("Extracting contextual data...")
+        partial = self.create_partial()
+        for trace in self.event_log:
+            partial.update(trace)
+        self.load_partial(partial)
+        metrics.progress("Contextual data extraction complete.")
+        return self.context_data
+
+    def extract_contextual_data_columnar(self):
+        # The contingency index is built by counting distinct (context codes, activity id) rows
+        log = self.event_log
+        columns = [log.attribute_codes(key) for key in self.broader_context_keys]
+        rows = np.stack([codes.astype(np.int64) for codes, _ in columns] + [log.activity_ids.astype(np.int64)], axis=1)
+        unique_rows, counts = np.unique(rows, axis=0, return_counts=True)
+        for row, count in zip(unique_rows.tolist(), counts.tolist()):
+            activity_id = row[-1]
+            context = tuple(values[code] if code >= 0 else None for code, (_, values) in zip(row[:-1], columns))
+            self.context_counts[context][log.activities[activity_id]] += count
+            self.context_totals[context] += count
+
+        last_positions = np.full(len(log.activities), -1, dtype=np.int64)
+        last_positions[log.activity_ids] = np.arange(log.n_events)
         context_data = {}
-        total_events = sum(len(trace) for trace in self.event_log)
-        processed_events = 0
-        print("Extracting contextual data...")
-        for trace_index, trace in enumerate(self.event_log, start=1):
-            for event in trace:
-                event_key = self.create_event_key(event)
-                context_data[event_key] = self.extract_attributes(event)
-                processed_events += 1
-                if processed_events % 100 == 0 or trace_index == len(self.event_log):
-                    print(f"Processed {processed_events}/{total_events} events. Trace {trace_index}/{len(self.event_log)}")
-        print("Contextual data extraction complete.")
+        for activity_id in log.activities_in_order().tolist():
+            position = last_positions[activity_id]
+            context = {}
+            for key, (codes, values) in zip(self.broader_context_keys, columns):
+                code = codes[position]
+                context[key] = values[code] if code >= 0 else None
+            context_data[log.activities[activity_id]] = context
         return context_data
 
     def create_event_key(self, event):
@@ -25,21 +62,25 @@ class ContextualInformationContentCalculator:
 
     def extract_attributes(self, event):
         # Extract broader attributes for context
-        broader_context_keys = ['lifecycle:transition', 'org:group']
-        return {key: event.get(key) for key in broader_context_keys}
+        return {key: event.get(key) for key in self.broader_context_keys}
 
     def get_contexts(self, event_key):
         # Retrieve context using the consistent event key
         return self.context_data.get(event_key, None)
 
     def estimate_conditional_probability(self, event, context):
-        matching_events = context_occurrences = 0
-        for other_event in sum(self.event_log, []): # Flatten the list of traces
-            other_event_key = self.create_event_key(other_event)
-            if self.is_context_match(other_event, context):
-                context_occurrences += 1
-                if other_event_key == event:
-                    matching_events += 1
+        if set(context) == set(self.broader_context_keys):
+            # Full context: O(1) lookup in the contingency index
+            context_key = tuple(context[key] for key in self.broader_context_keys)
+            context_occurrences = self.context_totals.get(context_key, 0)
+            matching_events = self.context_counts[context_key][event] if context_occurrences else 0
+        else:
+            # Partial context: aggregate the indexed contexts that agree on the given keys
+            matching_events = context_occurrences = 0
+            for context_key, total in self.context_totals.items():
+                if self.is_context_match(dict(zip(self.broader_context_keys, context_key)), context):
+                    context_occurrences += total
+                    matching_events += self.context_counts[context_key][event]
         return matching_events / context_occurrences if context_occurrences else 0
 
     def is_context_match(self, event, context):
@@ -50,27 +91,80 @@ class ContextualInformationContentCalculator:
         return True
 
     
+    @metrics.timed('contextual_ic')
     def calculate_contextual_information_content(self):
+        # The IC only depends on the activity and its context, so it is computed once per activity
         IC_contextual = {}
-        total_events = sum(len(trace) for trace in self.event_log)  # Calculate total number of events
-        processed_events = 0  # Initialize counter for processed events
-
-        for trace_index, trace in enumerate(self.event_log):
-            for event_index, event in enumerate(trace):
-                event_key = self.create_event_key(event)
-                context = self.get_contexts(event_key)
-                if context is not None:
-                    p_a_given_c = self.estimate_conditional_probability(event_key, context)
-                    IC_value = -self.lambda_val * math.log2(p_a_given_c) if p_a_given_c > 0 else float('inf')
-                    IC_contextual[event_key] = IC_value
-                else:
-                    print(f"No context found for event {event_key}. IC set to Inf.")
-                    IC_contextual[event_key] = float('inf')
-
-                processed_events += 1
-                # Progress update
-                progress_percentage = (processed_events / total_events) * 100
-                print(f"\rProgress: {progress_percentage:.2f}%", end='')
-
-        print("\nContextual data calculation complete.")
-        return IC_contextual   
+        for event_key, context in self.context_data.items():
+            p_a_given_c = self.estimate_conditional_probability(event_key, context)
+            IC_contextual[event_key] = -self.lambda_val * math.log2(p_a_given_c) if p_a_given_c > 0 else float('inf')
+
+        metrics.progress("Contextual data calculation complete.")
+        return IC_contextual
+
+    def create_partial(self):
+        # Empty mergeable statistics matching this calculator's context keys
+        return ContextualPartial(self.broader_context_keys)
+
+    @metrics.timed('contextual_ic')
+    def load_partial(self, partial):
+        # Replaces the calculator's contingency index with that of a (merged) ContextualPartial
+        self.context_counts = defaultdict(Counter, {context: Counter(counts) for context, counts in partial.context_counts.items()})
+        self.context_totals = Counter(partial.context_totals)
+        self.context_data = {event_key: dict(zip(self.broader_context_keys, context))
+                             for event_key, context in partial.last_context.items()}
+
+
+class ContextualPartial:
+    """Mergeable contingency index of the contextual IC over a slice of the traces.
+
+    The context of an activity is the one of its last occurrence, so merge is
+    associative but not commutative: slices must be merged in trace order.
+    Instances are plain data and can be pickled.
+    """
+
+    def __init__(self, context_keys):
+        self.context_keys = list(context_keys)
+        self.context_counts = defaultdict(Counter)
+        self.context_totals = Counter()
+        self.last_context = {}
+        self.activity_counts = Counter()
+
+    def update(self, trace):
+        for event in trace:
+            event_key = event['concept:name']
+            context = tuple(event.get(key) for key in self.context_keys)
+            self.last_context[event_key] = context
+            self.context_counts[context][event_key] += 1
+            self.context_totals[context] += 1
+            self.activity_counts[event_key] += 1
+        return self
+
+    def remove(self, trace):
+        # Inverse of update for the oldest traces: the last context of an activity only
+        # changes when no occurrence of it remains
+        for event in trace:
+            event_key = event['concept:name']
+            context = tuple(event.get(key) for key in self.context_keys)
+            counts = self.context_counts[context]
+            counts[event_key] -= 1
+            if counts[event_key] <= 0:
+                del counts[event_key]
+            if not counts:
+                del self.context_counts[context]
+            self.context_totals[context] -= 1
+            if self.context_totals[context] <= 0:
+                del self.context_totals[context]
+            self.activity_counts[event_key] -= 1
+            if self.activity_counts[event_key] <= 0:
+                del self.activity_counts[event_key]
+                del self.last_context[event_key]
+        return self
+
+    def merge(self, other):
+        for context, counts in other.context_counts.items():
+            self.context_counts[context].update(counts)
+        self.context_totals.update(other.context_totals)
+        self.last_context.update(other.last_context)
+        self.activity_counts.update(other.activity_counts)
+        return self
@@ -0,0 +1,163 @@
+import numpy as np
+
+from ColumnarEventLog import ColumnarEventLog
+from Instrumentation import metrics
+
+
+class DirectlyFollowsGraph:
+    """Activity x activity directly-follows counts of an event log.
+
+    counts[a, b] is the number of times activity id b directly follows activity
+    id a within a trace. The matrix is built in one vectorized pass: every pair
+    of consecutive events of the same trace is encoded as a * n + b and the
+    codes are counted with numpy.bincount.
+
+    Attributes:
+        activities (list): Activity id to activity name, ids in order of first appearance.
+        counts (numpy.ndarray): int64 matrix of directly-follows counts.
+        start_counts (numpy.ndarray): Number of traces starting with every activity.
+        end_counts (numpy.ndarray): Number of traces ending with every activity.
+    """
+
+    def __init__(self, activities, counts, start_counts, end_counts):
+        self.activities = activities
+        self.counts = counts
+        self.start_counts = start_counts
+        self.end_counts = end_counts
+
+    @classmethod
+    @metrics.timed('directly_follows')
+    def from_log(cls, log, by_timestamp=False):
+        """Count the directly-follows pairs of a log.
+
+        Args:
+            log: ColumnarEventLog, or traces of event dictionaries (encoded first).
+            by_timestamp (bool): Order the events of every trace by time:timestamp
+                (stably, events without one first) instead of their order in the file.
+
+        Returns:
+            DirectlyFollowsGraph: The counts, indexed by the activity ids of the log.
+        """
+        if not isinstance(log, ColumnarEventLog):
+            log = ColumnarEventLog.from_traces(log)
+        n_activities = len(log.activities)
+        activity_ids = log.activity_ids.astype(np.int64)
+        trace_index = log.trace_index()
+        if by_timestamp:
+            order = np.lexsort((log.timestamps, trace_index))
+            activity_ids = activity_ids[order]
+
+        same_trace = trace_index[1:] == trace_index[:-1]
+        pair_codes = activity_ids[:-1][same_trace] * n_activities + activity_ids[1:][same_trace]
+        counts = np.bincount(pair_codes, minlength=n_activities * n_activities).reshape(n_activities, n_activities)
+
+        offsets = log.trace_offsets
+        non_empty = offsets[1:] > offsets[:-1]
+        start_counts = np.bincount(activity_ids[offsets[:-1][non_empty]], minlength=n_activities)
+        end_counts = np.bincount(activity_ids[offsets[1:][non_empty] - 1], minlength=n_activities)
+        metrics.count('directly_follows_pairs', len(pair_codes))
+        return cls(list(log.activities), counts, start_counts, end_counts)
+
+    @classmethod
+    @metrics.timed('directly_follows')
+    def from_variants(cls, variants):
+        """Count the directly-follows pairs of a VariantIndex.
+
+        Every variant is visited once and its pairs are weighted by its number of
+        traces, so the counts equal those of from_log on the traces it indexes.
+
+        Args:
+            variants (VariantIndex): Activity sequences of the log, e.g. in file or timestamp order.
+
+        Returns:
+            DirectlyFollowsGraph: The counts, activity ids in order of first appearance.
+        """
+        activity_to_id = {}
+        sources, targets, pair_weights, starts, ends, trace_counts = [], [], [], [], [], []
+        for sequence, count in variants:
+            if not sequence:
+                continue
+            activity_ids = [activity_to_id.setdefault(activity, len(activity_to_id)) for activity in sequence]
+            sources.extend(activity_ids[:-1])
+            targets.extend(activity_ids[1:])
+            pair_weights.extend([count] * (len(activity_ids) - 1))
+            starts.append(activity_ids[0])
+            ends.append(activity_ids[-1])
+            trace_counts.append(count)
+
+        n_activities = len(activity_to_id)
+        pair_codes = np.array(sources, dtype=np.int64) * n_activities + np.array(targets, dtype=np.int64)
+        counts = np.bincount(pair_codes, weights=np.array(pair_weights, dtype=float),
+                             minlength=n_activities * n_activities).astype(np.int64).reshape(n_activities, n_activities)
+        start_counts = np.bincount(np.array(starts, dtype=np.int64), weights=np.array(trace_counts, dtype=float),
+                                   minlength=n_activities).astype(np.int64)
+        end_counts = np.bincount(np.array(ends, dtype=np.int64), weights=np.array(trace_counts, dtype=float),
+                                 minlength=n_activities).astype(np.int64)
+        metrics.count('directly_follows_pairs', int(counts.sum()))
+        return cls(list(activity_to_id), counts, start_counts, end_counts)
+
+    def edges(self):
+        """Return {(activity, next activity): count} for every observed pair."""
+        sources, targets = np.nonzero(self.counts)
+        return {(self.activities[a], self.activities[b]): int(self.counts[a, b])
+                for a, b in zip(sources.tolist(), targets.tolist())}
+
+
+@metrics.timed('relationship_inference')
+def infer_directly_follows_relationships(graph, dependency_threshold=0.5, min_frequency=0.0, parsed_log=None,
+                                         iic_weight=0.0):
+    """Infer sequence, parallel and choice relations from a directly-follows graph.
+
+    With F the (optionally weighted) counts, the dependency of a on b is
+    (F[a, b] - F[b, a]) / (F[a, b] + F[b, a] + 1), as in the heuristics miner.
+    b is a successor of a when F[a, b] is at least min_frequency times the largest
+    count leaving a and the dependency reaches dependency_threshold; a and b are
+    concurrent when they follow each other both ways with a dependency below it
+    in absolute value. A single successor is a 'sequence'; among several
+    successors, one concurrent with another successor is 'parallel' (an AND-split)
+    and the others are 'choice' (an XOR-split). Self-loops are ignored. All
+    relations are derived with whole-matrix operations.
+
+    Args:
+        graph (DirectlyFollowsGraph): Directly-follows counts.
+        dependency_threshold (float): Smallest dependency of a successor, in (0, 1).
+        min_frequency (float): Smallest count of a successor relative to the most frequent one, in [0, 1].
+        parsed_log (list): Optional (activity, IIC) ranking, e.g. from improved_information_content_algorithm.
+            Relations are then listed in ranking order of their activities.
+        iic_weight (float): With parsed_log, how much the counts into an activity are scaled by its
+            IIC normalised to [0, 1]: 0 leaves them unchanged, 1 scales them fully.
+
+    Returns:
+        list: (activity, next activity, relation type) tuples, ready for PetriNetModel.build_directly_follows_petri_net.
+    """
+    n_activities = len(graph.activities)
+    frequencies = graph.counts.astype(float)
+    order = np.arange(n_activities)
+    if parsed_log is not None:
+        iic = dict(parsed_log)
+        scores = np.array([iic.get(activity, np.nan) for activity in graph.activities], dtype=float)
+        ranked = np.isfinite(scores)
+        if ranked.any() and iic_weight:
+            low, high = scores[ranked].min(), scores[ranked].max()
+            normalised = np.where(ranked, (scores - low) / (high - low) if high > low else 1.0, 1.0)
+            frequencies *= 1 - iic_weight + iic_weight * normalised[None, :]
+        # Ranked activities by decreasing IIC, then the unranked ones in order of first appearance
+        order = np.lexsort((order, np.where(ranked, -np.nan_to_num(scores), np.inf)))
+
+    np.fill_diagonal(frequencies, 0)
+    transposed = frequencies.T
+    dependency = (frequencies - transposed) / (frequencies + transposed + 1)
+    largest = frequencies.max(axis=1, initial=0)[:, None]
+    successor = (frequencies > 0) & (frequencies >= min_frequency * largest) & (dependency >= dependency_threshold)
+    concurrent = (frequencies > 0) & (transposed > 0) & (np.abs(dependency) < dependency_threshold)
+
+    # split_partners[a, b]: successors of a concurrent with b
+    split_partners = successor.astype(np.int64) @ concurrent.astype(np.int64)
+    single = successor.sum(axis=1) == 1
+    codes = np.where(single[:, None], 1, np.where(split_partners > 0, 2, 3)) * successor
+
+    relation_types = np.array([None, 'sequence', 'parallel', 'choice'], dtype=object)
+    ordered = codes[np.ix_(order, order)]
+    sources, targets = np.nonzero(ordered)
+    names = np.array(graph.activities, dtype=object)[order]
+    return list(zip(names[sources].tolist(), names[targets].tolist(), relation_types[ordered[sources, targets]].tolist()))
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+CACHE_FORMAT_VERSION = 1
+NAIVE_OFFSET = np.iinfo(np.int32).min  # tz offset marker for timezone-naive timestamps
+MISSING_DATE = np.iinfo(np.int64).min
+
+
+class EventLogCache:
+    """On-disk cache of parsed XES event logs.
+
+    Each entry holds the traces parsed from one source file in a compact columnar
+    form: one NumPy array per attribute key (dictionary-encoded for strings, int64
+    microseconds for dates) plus trace offsets. Arrays are stored as .npy files and
+    memory-mapped on load. Entries are keyed by the source path, size and mtime
+    (or content hash) and by the parse options, so a changed source file or a
+    different attribute projection never hits a stale entry. The total size of the
+    cache is bounded, least recently used entries being evicted first.
+
+    Attributes:
+        cache_dir (str): Directory holding the cache entries.
+        max_bytes (int): Upper bound on the total size of all entries.
+        use_hash (bool): Key entries by a SHA-256 of the file content instead of its mtime.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, use_hash=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.use_hash = use_hash
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_key(self, xes_file_path, attribute_keys=None):
+        """Build the cache key of a source file for the given parse options."""
+        stat = os.stat(xes_file_path)
+        if self.use_hash:
+            digest = hashlib.sha256()
+            with open(xes_file_path, 'rb') as source:
+                for block in iter(lambda: source.read(1024 * 1024), b""):
+                    digest.update(block)
+            version = digest.hexdigest()
+        else:
+            version = stat.st_mtime_ns
+        key = {
+            'format': CACHE_FORMAT_VERSION,
+            'path': os.path.abspath(xes_file_path),
+            'size': stat.st_size,
+            'version': version,
+            'attribute_keys': None if attribute_keys is None else sorted(attribute_keys),
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def load(self, xes_file_path, attribute_keys=None, max_traces=100):
+        """Return the cached traces of a file, or None on a cache miss.
+
+        An entry can serve the request if it holds at least max_traces traces, or if
+        it was built from a parse that exhausted the file.
+
+        Args:
+            xes_file_path (str): The file path of the XES file.
+            attribute_keys (set): The attribute projection used for parsing.
+            max_traces (int): The maximum number of traces wanted from the file.
+
+        Returns:
+            list: The cached traces, or None if no usable entry exists.
+        """
+        found = self.lookup(xes_file_path, attribute_keys, max_traces)
+        if found is None:
+            return None
+        entry_dir, meta = found
+        os.utime(os.path.join(entry_dir, 'meta.json'))  # mark the entry as recently used
+        return self.decode_traces(entry_dir, meta, max_traces)
+
+    def lookup(self, xes_file_path, attribute_keys=None, max_traces=100):
+        """Return (entry directory, metadata) of a usable entry for the file, or None."""
+        entry_dir = os.path.join(self.cache_dir, self.entry_key(xes_file_path, attribute_keys))
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        if meta['trace_count'] < max_traces and not meta['complete']:
+            return None
+        return entry_dir, meta
+
+    def store(self, xes_file_path, traces, attribute_keys=None, max_traces=100):
+        """Store the traces parsed from a file, replacing stale entries of the same file.
+
+        Args:
+            xes_file_path (str): The file path of the XES file.
+            traces (list): The parsed traces.
+            attribute_keys (set): The attribute projection used for parsing.
+            max_traces (int): The trace budget the file was parsed with.
+        """
+        key = self.entry_key(xes_file_path, attribute_keys)
+        source_path = os.path.abspath(xes_file_path)
+        entry_dir = os.path.join(self.cache_dir, key)
+        staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=self.cache_dir)
+        meta = self.encode_traces(staging_dir, traces)
+        meta.update({
+            'source': source_path,
+            'attribute_keys': None if attribute_keys is None else sorted(attribute_keys),
+            'complete': len(traces) < max_traces,
+        })
+        with open(os.path.join(staging_dir, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(staging_dir, entry_dir)
+
+        for entry, entry_meta, _, _ in self.entries():
+            if entry != key and entry_meta.get('source') == source_path \
+                    and entry_meta.get('attribute_keys') == meta['attribute_keys']:
+                shutil.rmtree(os.path.join(self.cache_dir, entry), ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """List (key, meta, size in bytes, last use) for every complete entry."""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, 'meta.json')
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            entry_dir = os.path.join(self.cache_dir, name)
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            found.append((name, meta, size, os.path.getmtime(meta_path)))
+        return found
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits within max_bytes."""
+        entries = sorted(self.entries(), key=lambda entry: entry[3])
+        total = sum(size for _, _, size, _ in entries)
+        for name, _, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        for name in os.listdir(self.cache_dir):
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    @staticmethod
+    def encode_traces(entry_dir, traces):
+        """Write traces as columnar .npy files into entry_dir and return the entry metadata."""
+        lengths = [len(trace) for trace in traces]
+        trace_offsets = np.zeros(len(traces) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=trace_offsets[1:])
+        np.save(os.path.join(entry_dir, 'trace_offsets.npy'), trace_offsets)
+        events = [event for trace in traces for event in trace]
+
+        columns = []
+        keys = list(dict.fromkeys(key for event in events for key in event))
+        for index, key in enumerate(keys):
+            values = [event.get(key) for event in events]
+            kinds = {type(value) for value in values if value is not None}
+            column = {'key': key, 'file': f'col{index}'}
+            path = os.path.join(entry_dir, column['file'])
+            if kinds == {str}:
+                dictionary = {}
+                codes = np.fromiter((-1 if value is None else dictionary.setdefault(value, len(dictionary))
+                                     for value in values), dtype=np.int32, count=len(values))
+                column.update(kind='string', values=list(dictionary))
+                np.save(path + '.npy', codes)
+            elif kinds == {datetime}:
+                micros = np.full(len(values), MISSING_DATE, dtype=np.int64)
+                offsets = np.full(len(values), NAIVE_OFFSET, dtype=np.int32)
+                for position, value in enumerate(values):
+                    if value is None:
+                        continue
+                    offset = value.utcoffset()
+                    if offset is not None:
+                        offsets[position] = int(offset.total_seconds())
+                        value = value.replace(tzinfo=None) - offset
+                    micros[position] = (value - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+                column.update(kind='date')
+                np.save(path + '.npy', micros)
+                np.save(path + '_tz.npy', offsets)
+            elif kinds in ({int}, {float}, {bool}):
+                kind = kinds.pop()
+                present = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+                data = np.array([0 if value is None else value for value in values], dtype=kind)
+                column.update(kind=kind.__name__)
+                np.save(path + '.npy', data)
+                np.save(path + '_present.npy', present)
+            else:
+                column.update(kind='object')
+                with open(path + '.pkl', 'wb') as column_file:
+                    pickle.dump(values, column_file, protocol=pickle.HIGHEST_PROTOCOL)
+            columns.append(column)
+        return {'trace_count': len(traces), 'event_count': len(events), 'columns': columns}
+
+    @staticmethod
+    def decode_traces(entry_dir, meta, max_traces):
+        """Rebuild up to max_traces traces from the memory-mapped columns of an entry."""
+        trace_offsets = np.load(os.path.join(entry_dir, 'trace_offsets.npy'), mmap_mode='r')
+        trace_count = min(meta['trace_count'], max_traces)
+        event_count = int(trace_offsets[trace_count])
+        events = [{} for _ in range(event_count)]
+
+        for column in meta['columns']:
+            key = column['key']
+            path = os.path.join(entry_dir, column['file'])
+            if column['kind'] == 'object':
+                with open(path + '.pkl', 'rb') as column_file:
+                    values = pickle.load(column_file)[:event_count]
+            else:
+                data = np.load(path + '.npy', mmap_mode='r')[:event_count]
+                if column['kind'] == 'string':
+                    dictionary = column['values']
+                    values = [None if code < 0 else dictionary[code] for code in data.tolist()]
+                elif column['kind'] == 'date':
+                    offsets = np.load(path + '_tz.npy', mmap_mode='r')[:event_count]
+                    values = decode_dates(data, offsets)
+                else:
+                    present = np.load(path + '_present.npy', mmap_mode='r')[:event_count]
+                    values = [value if flag else None for value, flag in zip(data.tolist(), present.tolist())]
+            for event, value in zip(events, values):
+                if value is not None:
+                    event[key] = value
+
+        bounds = trace_offsets[:trace_count + 1].tolist()
+        return [events[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def decode_dates(micros, offsets):
+    """Convert epoch microseconds and UTC offsets back into datetime objects."""
+    micros = np.asarray(micros)
+    offsets = np.asarray(offsets)
+    naive = offsets == NAIVE_OFFSET
+    local = micros + np.where(naive, 0, offsets).astype(np.int64) * 1_000_000
+    timezones = {}
+    values = []
+    for value, micro, offset in zip(local.astype('datetime64[us]').tolist(), micros.tolist(), offsets.tolist()):
+        if micro == MISSING_DATE:
+            values.append(None)
+        elif offset == NAIVE_OFFSET:
+            values.append(value)
+        else:
+            tz = timezones.get(offset)
+            if tz is None:
+                tz = timezones[offset] = timezone(timedelta(seconds=offset))
+            values.append(value.replace(tzinfo=tz))
+    return values
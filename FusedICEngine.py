@@ -0,0 +1,235 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ContextualInformationContent import ContextualInformationContentCalculator
+from IIC import improved_information_content_algorithm
+from Instrumentation import metrics
+from MultiDimensionalInformationContent import MultiDimICCalculator
+from TemporalInformationContent import TemporalInformationContentCalculator
+from UncertaintyInformationContent import UncertaintyICCalculator
+from XESParser import XESParser
+
+
+class FusedICEngine:
+    """Computes all four IC dimensions and the IIC ranking from one pass over the traces.
+
+    While consuming traces, the engine only accumulates the mergeable partial
+    statistics of every calculator (TemporalPartial, ContextualPartial,
+    MultiDimPartial and UncertaintyPartial). The traces themselves are not kept,
+    so they can come straight from XESParser.iter_all_xes_files. compute() then
+    loads the statistics into the calculators, which derive the same IC values as
+    when run on the full log.
+
+    Engines built over consecutive slices of a log can be combined with merge,
+    which is how compute_ic_parallel spreads the work over processes.
+
+    With approximate=True the multi-dimensional frequencies are counted in
+    Count-Min sketches and heavy-hitter trackers, and together with
+    cardinality_precision (HyperLogLog distinct counts) this bounds the memory of
+    the statistics regardless of the size of the log. compute() then also reports
+    the error bound of every approximate IC value.
+
+    Attributes:
+        lambda_val (float): Scaling factor of the temporal and contextual IC.
+        temporal (TemporalInformationContentCalculator): Temporal calculator and its settings.
+        contextual (ContextualInformationContentCalculator): Contextual calculator.
+        multidim (MultiDimICCalculator): Multi-dimensional calculator and its settings.
+        uncertainty (UncertaintyICCalculator): Uncertainty calculator and its settings.
+        partials (dict): Calculator name to its partial statistics.
+        n_traces (int): Number of traces consumed.
+    """
+
+    def __init__(self, lambda_val, window=1, time_scale=60, max_order=2, min_support=1, cardinality_precision=None,
+                 approximate=False, sketch_width=2048, sketch_depth=5, heavy_hitters=1000):
+        self.lambda_val = lambda_val
+        self.options = {'window': window, 'time_scale': time_scale, 'max_order': max_order,
+                        'min_support': min_support, 'cardinality_precision': cardinality_precision,
+                        'approximate': approximate, 'sketch_width': sketch_width, 'sketch_depth': sketch_depth,
+                        'heavy_hitters': heavy_hitters}
+        self.temporal = TemporalInformationContentCalculator(window=window, time_scale=time_scale)
+        self.contextual = ContextualInformationContentCalculator(None, lambda_val)
+        self.multidim = MultiDimICCalculator(None, max_order=max_order, min_support=min_support, approximate=approximate,
+                                             sketch_width=sketch_width, sketch_depth=sketch_depth,
+                                             heavy_hitters=heavy_hitters)
+        self.uncertainty = UncertaintyICCalculator(None, cardinality_precision=cardinality_precision)
+        self.partials = self.create_partials()
+        self.n_traces = 0
+
+    def create_partials(self):
+        """Return empty partial statistics for the four calculators."""
+        return {
+            'temporal': self.temporal.create_partial(),
+            'contextual': self.contextual.create_partial(),
+            'multidim': self.multidim.create_partial(),
+            'uncertainty': self.uncertainty.create_partial(),
+        }
+
+    @property
+    def activity_counts(self):
+        """Occurrences of every activity, in order of first appearance."""
+        return self.partials['uncertainty'].activity_counts
+
+    @property
+    def n_events(self):
+        return sum(self.activity_counts.values())
+
+    def attribute_keys(self):
+        """Event attribute keys read by name: the activity, timestamp, contextual keys and the attributes
+        the uncertainty IC expects. The uncertainty IC also scores every other attribute an event has."""
+        return ({'concept:name', 'time:timestamp'} | set(self.contextual.broader_context_keys)
+                | set(self.uncertainty.expected_attributes))
+
+    def consume(self, traces):
+        """Accumulate the statistics of an iterable of traces."""
+        with metrics.stage('statistics'):
+            for trace in traces:
+                self.update(trace)
+        return self
+
+    def update(self, trace):
+        """Accumulate the statistics of one trace."""
+        self.n_traces += 1
+        for partial in self.partials.values():
+            partial.update(trace)
+
+    def merge(self, other):
+        """Fold in the statistics of an engine built over the traces that follow this one's."""
+        for name, partial in self.partials.items():
+            partial.merge(other.partials[name])
+        self.n_traces += other.n_traces
+        return self
+
+    def compute(self):
+        """Derive the four IC dictionaries and the IIC ranking from the accumulated statistics.
+
+        Returns:
+            dict: IC_Temporal, IC_Contextual, IC_MultiDim and IC_Uncertainty dictionaries,
+                parsed_log, the activities ranked by IIC, IC_error_bounds, the error bounds of the
+                IC_MultiDim and IC_Uncertainty values (all zero unless sketches are used), and
+                IIC_error_bounds, the resulting bound on the IIC of every activity.
+        """
+        IC_Temporal = self.temporal.calculate_from_partial(self.partials['temporal'], self.lambda_val)
+
+        self.contextual.load_partial(self.partials['contextual'])
+        IC_Contextual = self.contextual.calculate_contextual_information_content()
+
+        self.multidim.load_partial(self.partials['multidim'])
+        self.multidim.calculate_information_content()
+        IC_MultiDim = self.multidim.IC_MultiDim
+
+        self.uncertainty.load_partial(self.partials['uncertainty'])
+        IC_Uncertainty = self.uncertainty.calculate()
+
+        parsed_log = improved_information_content_algorithm(None, IC_Temporal, IC_Contextual, IC_MultiDim, IC_Uncertainty,
+                                                            activities=self.activity_counts)
+        IC_error_bounds = {'IC_MultiDim': self.multidim.IC_error_bounds, 'IC_Uncertainty': self.uncertainty.IC_error_bounds}
+        # The IIC averages the four dimensions, so each error bound contributes a quarter
+        IIC_error_bounds = {activity: (IC_error_bounds['IC_MultiDim'].get(frozenset([activity]), 0)
+                                       + IC_error_bounds['IC_Uncertainty'].get(activity, 0)) / 4
+                            for activity, _ in parsed_log}
+        return {
+            'IC_Temporal': IC_Temporal,
+            'IC_Contextual': IC_Contextual,
+            'IC_MultiDim': IC_MultiDim,
+            'IC_Uncertainty': IC_Uncertainty,
+            'parsed_log': parsed_log,
+            'IC_error_bounds': IC_error_bounds,
+            'IIC_error_bounds': IIC_error_bounds,
+        }
+
+
+def compute_ic_parallel(xes_dir_path, lambda_val, workers=None, chunk_size=64 * 1024 * 1024,
+                        attribute_keys=None, **engine_options):
+    """Map-reduce the IC computation of every XES file in a directory over a process pool.
+
+    Each worker parses one work unit (a file, or a byte range of a large file cut on
+    trace boundaries) and returns the partial statistics of its traces. Partials are
+    merged in file and offset order, so the result is identical to a sequential run
+    over the whole log.
+
+    Args:
+        xes_dir_path (str): Directory path where XES files are located.
+        lambda_val (float): Scaling factor of the temporal and contextual IC.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        chunk_size (int): Approximate size in bytes of the ranges large files are split into.
+        attribute_keys (iterable): Event attribute keys to keep while parsing.
+        **engine_options: Options of FusedICEngine (window, max_order, ...).
+
+    Returns:
+        FusedICEngine: The engine holding the merged statistics; call compute() on it.
+    """
+    parser = XESParser(xes_dir_path, attribute_keys=attribute_keys)
+    units = []
+    for file_name in parser.list_xes_files():
+        units.extend(parser.split_trace_ranges(os.path.join(xes_dir_path, file_name), chunk_size))
+    engine = FusedICEngine(lambda_val, **engine_options)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_partial_ic_work_unit, xes_dir_path, parser.attribute_keys, unit, lambda_val, engine_options)
+                   for unit in units]
+        for future in futures:
+            # Worker processes count into their own metrics, so their traces are counted here
+            partial_engine = future.result()
+            metrics.count('traces_parsed', partial_engine.n_traces)
+            metrics.count('events_parsed', partial_engine.n_events)
+            engine.merge(partial_engine)
+    return engine
+
+
+def _partial_ic_work_unit(xes_dir_path, attribute_keys, unit, lambda_val, engine_options):
+    """Parse one work unit in a worker process and return an engine holding its partial statistics."""
+    parser = XESParser(xes_dir_path, attribute_keys=attribute_keys)
+    traces = parser.parse_xes_byte_range(*unit, max_traces=float('inf'))
+    return FusedICEngine(lambda_val, **engine_options).consume(traces)
+
+
+def ic_confidence_intervals(sampler, lambda_val, n_bootstrap=200, confidence=0.95, seed=None, **engine_options):
+    """Estimate the IC values from a trace sample, with bootstrap confidence intervals.
+
+    The sample must be self-weighting (a sampler without coverage), so that IC
+    values computed on it estimate those of the log. The replicates resample every
+    stratum of the sample with replacement, keeping its size, so the intervals
+    reflect the stratified design of the sampler. The
+    temporal, contextual and multi-dimensional IC only depend on relative
+    frequencies and estimate their full-log values; the uncertainty factors are
+    absolute counts, so IC_Uncertainty is estimated at the scale of the sample.
+
+    Args:
+        sampler (TraceSampler): Sampler that has seen the whole log, e.g. XESParser.sampler.
+        lambda_val (float): Scaling factor of the temporal and contextual IC.
+        n_bootstrap (int): Number of bootstrap replicates.
+        confidence (float): Coverage of the intervals.
+        seed (int): Seed of the resampling, for reproducible intervals.
+        **engine_options: Options of FusedICEngine (window, max_order, ...).
+
+    Returns:
+        dict: 'estimates', the result of FusedICEngine.compute on the sample, and 'intervals',
+            mapping IC_Temporal, IC_Contextual, IC_MultiDim, IC_Uncertainty and IIC to
+            key -> (lower, upper) percentile bounds. Keys absent from a replicate are
+            bounded over the replicates that contain them.
+    """
+    if sampler.coverage:
+        raise ValueError("a coverage sample over-represents small strata; sample with coverage=False to estimate IC")
+    rng = random.Random(seed)
+    strata = [traces for _, traces in sampler.stratum_samples().values() if traces]
+    estimates = FusedICEngine(lambda_val, **engine_options).consume(sampler.sample()).compute()
+    dimensions = ('IC_Temporal', 'IC_Contextual', 'IC_MultiDim', 'IC_Uncertainty')
+    replicates = {dimension: {} for dimension in dimensions + ('IIC',)}
+    for _ in range(n_bootstrap):
+        engine = FusedICEngine(lambda_val, **engine_options)
+        for traces in strata:
+            engine.consume(rng.choices(traces, k=len(traces)))
+        results = engine.compute()
+        results['IIC'] = dict(results['parsed_log'])
+        for dimension, values in replicates.items():
+            for key, value in results[dimension].items():
+                values.setdefault(key, []).append(value)
+
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for dimension, values in replicates.items():
+        intervals[dimension] = {key: tuple(np.percentile(samples, [tail, 100 - tail]).tolist())
+                                for key, samples in values.items()}
+    return {'estimates': estimates, 'intervals': intervals}
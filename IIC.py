@@ -1,5 +1,13 @@
 #IIC - Improved Information Content
-def improved_information_content_algorithm(event_log, ic_temporal, ic_contextual, ic_multidim, ic_uncertainty):
+from ColumnarEventLog import ColumnarEventLog
+from Instrumentation import metrics
+from VariantIndex import VariantIndex
+
+
+@metrics.timed('iic')
+def improved_information_content_algorithm(event_log, ic_temporal, ic_contextual, ic_multidim, ic_uncertainty,
+                                           activities=None):
+    # activities: optional iterable of activity names to rank, in place of those collected from event_log
     # Invert the uncertainty IC values
     inverted_uncertainty_ic = {activity: -value for activity, value in ic_uncertainty.items()}
 
@@ -14,11 +22,26 @@ def improved_information_content_algorithm(event_log, ic_temporal, ic_contextual
     
     # Collect and calculate comprehensive IC for each unique activity in the log
     activity_ic_scores = {}
-    for trace in event_log:
-        for event in trace:
-            activity = event['concept:name']
+    if activities is not None:
+        for activity in activities:
             if activity not in activity_ic_scores:
                 activity_ic_scores[activity] = calculate_comprehensive_ic(activity)
+    elif isinstance(event_log, ColumnarEventLog):
+        for activity_id in event_log.activities_in_order().tolist():
+            activity = event_log.activities[activity_id]
+            activity_ic_scores[activity] = calculate_comprehensive_ic(activity)
+    elif isinstance(event_log, VariantIndex):
+        # One visit per distinct activity sequence instead of one per trace
+        for activities, _ in event_log:
+            for activity in activities:
+                if activity not in activity_ic_scores:
+                    activity_ic_scores[activity] = calculate_comprehensive_ic(activity)
+    else:
+        for trace in event_log:
+            for event in trace:
+                activity = event['concept:name']
+                if activity not in activity_ic_scores:
+                    activity_ic_scores[activity] = calculate_comprehensive_ic(activity)
     
     # Sort activities by their comprehensive IC values
     parsed_log= sorted(activity_ic_scores.items(), key=lambda x: x[1], reverse=True)
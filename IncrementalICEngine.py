@@ -0,0 +1,111 @@
+from collections import deque
+from datetime import timedelta
+
+from ColumnarEventLog import MISSING_TIMESTAMP, encode_timestamp
+from FusedICEngine import FusedICEngine
+from MultiDimensionalInformationContent import MultiDimPartial
+from ProcessDiscovery import infer_relationships
+
+
+class IncrementalICEngine(FusedICEngine):
+    """FusedICEngine that keeps its IC values current as traces arrive and expire.
+
+    Adding or expiring a trace updates the sufficient statistics in time
+    proportional to that trace: its events, and with exact counting the
+    Apriori candidate combinations (up to max_order) it contains, i.e. the
+    frequent ones and those whose smaller subsets are all frequent (see
+    MultiDimPartial). The IC dictionaries, the IIC ranking and the inferred
+    relationships are derived from the statistics on demand and cached until
+    the next change. A refresh recomputes every dimension from the statistics,
+    so it costs O(activities + activity pairs + contexts + candidate
+    combinations), independent of the number of traces. When a combination
+    turns frequent or infrequent, the candidates are regenerated and the new
+    ones counted in one pass over the distinct trace activity sets.
+
+    Traces can be expired over a count window (max_traces most recent traces) or
+    a time window (traces whose last timestamp is older than max_age relative to
+    the newest trace), in arrival order. Interval minima and maxima are bounds
+    over every trace added so far, as they cannot be updated on removal.
+
+    Attributes:
+        max_traces (int): Size of the count window, or None.
+        max_age (datetime.timedelta): Length of the time window, or None.
+        window (collections.deque): (trace, last timestamp) of the traces currently counted.
+    """
+
+    def __init__(self, lambda_val, max_traces=None, max_age=None, **engine_options):
+        self.max_traces = max_traces
+        self.max_age = timedelta(seconds=max_age) if isinstance(max_age, (int, float)) else max_age
+        if engine_options.get('cardinality_precision') is not None and self.windowed:
+            raise ValueError("HyperLogLog distinct counts cannot be decremented; disable cardinality_precision for windowed updates")
+        if engine_options.get('approximate') and self.windowed:
+            raise ValueError("heavy-hitter tracking cannot be undone; disable approximate for windowed updates")
+        super().__init__(lambda_val, **engine_options)
+        self.window = deque()
+        self.newest_timestamp = MISSING_TIMESTAMP
+        self._results = None
+
+    @property
+    def windowed(self):
+        return self.max_traces is not None or self.max_age is not None
+
+    def create_partials(self):
+        partials = super().create_partials()
+        if self.windowed:
+            partials['uncertainty'] = self.uncertainty.create_partial(invertible=True)
+        if not self.options['approximate']:
+            partials['multidim'] = MultiDimPartial(max_order=self.options['max_order'])
+        return partials
+
+    def add_trace(self, trace):
+        """Add one trace, then expire the traces that fell out of the window."""
+        self.update(trace)
+        last_timestamp = max((encode_timestamp(event.get('time:timestamp')) for event in trace), default=MISSING_TIMESTAMP)
+        self.newest_timestamp = max(self.newest_timestamp, last_timestamp)
+        if self.windowed:
+            self.window.append((trace, last_timestamp))
+        self.expire()
+        self._results = None
+
+    def add_traces(self, traces):
+        """Add every trace of an iterable."""
+        for trace in traces:
+            self.add_trace(trace)
+        return self
+
+    def expire(self):
+        """Remove the traces that no longer fit in the count or time window."""
+        if self.max_traces is not None:
+            while len(self.window) > self.max_traces:
+                self.remove(self.window.popleft()[0])
+        if self.max_age is not None and self.newest_timestamp != MISSING_TIMESTAMP:
+            oldest_allowed = self.newest_timestamp - self.max_age // timedelta(microseconds=1)
+            while self.window and self.window[0][1] < oldest_allowed:
+                self.remove(self.window.popleft()[0])
+
+    def remove(self, trace):
+        """Subtract the statistics of a trace previously added."""
+        self.n_traces -= 1
+        for partial in self.partials.values():
+            partial.remove(trace)
+        self._results = None
+
+    @property
+    def results(self):
+        """The IC dictionaries and IIC ranking of the traces currently counted (see compute)."""
+        if self._results is None:
+            self._results = self.compute() if self.n_events else {
+                'IC_Temporal': {}, 'IC_Contextual': {}, 'IC_MultiDim': {}, 'IC_Uncertainty': {}, 'parsed_log': [],
+                'IC_error_bounds': {'IC_MultiDim': {}, 'IC_Uncertainty': {}}, 'IIC_error_bounds': {},
+            }
+        return self._results
+
+    @property
+    def parsed_log(self):
+        """Activities ranked by IIC over the traces currently counted."""
+        return self.results['parsed_log']
+
+    def inferred_relationships(self, sequence_threshold=0.2, parallel_threshold_max=1.0, choice_threshold=1.0):
+        """Relationships inferred from the current IIC ranking."""
+        return infer_relationships(self.parsed_log, sequence_threshold, parallel_threshold_max, choice_threshold)
+
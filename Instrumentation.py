@@ -0,0 +1,169 @@
+import functools
+import json
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class MetricsSink:
+    """Receiver of instrumentation records. Subclasses override the hooks they need."""
+
+    def stage(self, name, seconds, peak_bytes):
+        """Called when a stage finishes."""
+
+    def progress(self, message):
+        """Called with a rate-limited progress message."""
+
+    def report(self, stages, counters):
+        """Called with the stage totals and the counters at the end of a run."""
+
+
+class PrintSink(MetricsSink):
+    """Prints progress messages and the end-of-run report."""
+
+    def progress(self, message):
+        print(message)
+
+    def report(self, stages, counters):
+        print(format_report(stages, counters))
+
+
+class JsonLinesSink(MetricsSink):
+    """Appends every finished stage and the end-of-run report to a JSON Lines file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, record):
+        with open(self.path, 'a') as output:
+            output.write(json.dumps(record) + '\n')
+
+    def stage(self, name, seconds, peak_bytes):
+        self.write({'type': 'stage', 'stage': name, 'seconds': seconds, 'peak_bytes': peak_bytes})
+
+    def report(self, stages, counters):
+        self.write({'type': 'report', 'stages': stages, 'counters': dict(counters)})
+
+
+class Instrumentation:
+    """Stage timers, counters, peak-memory samples and progress reporting.
+
+    The modules of the pipeline report to the shared metrics instance below:
+    stages are timed with `with metrics.stage(name)`, work is counted with
+    metrics.count, and progress messages go through metrics.progress, which
+    forwards at most one message per progress_interval seconds and nothing at
+    all when progress_interval is None (the default). Timers and counters are
+    always collected, as they cost a few dictionary updates per trace, and
+    report() hands their totals to the sinks. A stage entered again while it is
+    already running (an entry point calling another one) is timed only once.
+
+    Peak memory is the peak traced by tracemalloc when it is running, otherwise
+    the peak resident set size of the process.
+
+    Attributes:
+        sinks (list): MetricsSink instances receiving the records.
+        progress_interval (float): Minimum number of seconds between progress messages, or None.
+        stages (dict): Stage name to {'calls', 'seconds', 'peak_bytes'}, in order of first use.
+        counters (collections.Counter): Counter name to value.
+    """
+
+    def __init__(self, sinks=None, progress_interval=None):
+        self.configure(sinks, progress_interval)
+
+    def configure(self, sinks=None, progress_interval=None):
+        """Replace the sinks and progress setting, and reset the collected metrics."""
+        self.sinks = [PrintSink()] if sinks is None else list(sinks)
+        self.progress_interval = progress_interval
+        self.reset()
+        return self
+
+    def reset(self):
+        self.stages = {}
+        self.counters = Counter()
+        self._active = set()
+        self._last_progress = float('-inf')
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one call of the named stage."""
+        if name in self._active:
+            yield
+            return
+        self._active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active.discard(name)
+            seconds = time.perf_counter() - started
+            peak_bytes = self.sample_memory()
+            totals = self.stages.get(name)
+            if totals is None:
+                totals = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'peak_bytes': None}
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            if peak_bytes is not None:
+                totals['peak_bytes'] = max(totals['peak_bytes'] or 0, peak_bytes)
+            for sink in self.sinks:
+                sink.stage(name, seconds, peak_bytes)
+
+    def timed(self, name):
+        """Decorator timing every call of a function as the named stage."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def progress(self, message):
+        """Forward a progress message, unless disabled or one was sent less than progress_interval ago."""
+        if self.progress_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        for sink in self.sinks:
+            sink.progress(message)
+
+    @staticmethod
+    def sample_memory():
+        """Return the current peak memory in bytes, or None if it cannot be measured."""
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[1]
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def report(self):
+        """Send the stage totals and counters to the sinks, and return them as text."""
+        for sink in self.sinks:
+            sink.report(self.stages, self.counters)
+        return format_report(self.stages, self.counters)
+
+
+def format_report(stages, counters):
+    """Format stage totals and counters as a plain-text table."""
+    lines = ['Stage timings:']
+    for name, totals in stages.items():
+        peak = '' if totals['peak_bytes'] is None else f"  peak {totals['peak_bytes'] / 2 ** 20:8.1f} MiB"
+        lines.append(f"  {name:<24}{totals['calls']:>6} call(s){totals['seconds']:10.3f} s{peak}")
+    if counters:
+        lines.append('Counters: ' + ', '.join(f'{name}={value}' for name, value in counters.items()))
+    return '\n'.join(lines)
+
+
+metrics = Instrumentation()
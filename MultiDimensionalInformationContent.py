@@ -1,35 +1,181 @@
+import math
+from collections import Counter, defaultdict
+from itertools import combinations
+
+import numpy as np
+
+from ColumnarEventLog import ColumnarEventLog
+from Instrumentation import metrics
+from Sketches import CountMinSketch, HeavyHitters, information_error_bound
+from VariantIndex import VariantIndex
+
+
 class MultiDimICCalculator:
-    def __init__(self, event_log):
+    def __init__(self, event_log, max_order=2, min_support=1, approximate=False,
+                 sketch_width=2048, sketch_depth=5, heavy_hitters=1000):
+        # max_order: largest number of activities in a combination
+        # min_support: minimum number of traces containing a combination (a float below 1 is a
+        # fraction of the traces); rarer combinations, and all their supersets, are pruned
+        # approximate: count activities and combinations in Count-Min sketches of sketch_width x
+        # sketch_depth counters, keeping only the heavy_hitters most frequent keys of each, so memory
+        # no longer grows with the log; IC_error_bounds then holds the error of every IC value
         self.event_log = event_log
+        self.max_order = max_order
+        self.min_support = min_support
+        self.approximate = approximate
+        self.sketch_options = {'width': sketch_width, 'depth': sketch_depth, 'capacity': heavy_hitters}
         self.IC_MultiDim = {}
+        self.IC_error_bounds = {}
         # Additional structures for optimized computation
         self.activity_frequency = defaultdict(int)
         self.combination_frequency = defaultdict(int)
 
+    @metrics.timed('multidim_ic')
     def calculate(self):
         self.calculate_frequencies()
         self.calculate_information_content()
         return self.IC_MultiDim
 
+    @metrics.timed('multidim_ic')
     def calculate_frequencies(self):
-        print("Calculating frequencies...")
+        if self.approximate:
+            return self.calculate_frequencies_approximate()
+        if isinstance(self.event_log, ColumnarEventLog):
+            return self.calculate_frequencies_columnar()
+        if isinstance(self.event_log, VariantIndex):
+            return self.calculate_frequencies_variants()
+        metrics.progress("Calculating frequencies...")
+        partial = self.create_partial()
+        for trace in self.event_log:
+            partial.update(trace)
+        self.load_partial(partial)
+        metrics.progress("Frequencies calculation complete.")
+
+    def calculate_frequencies_variants(self):
+        # Each distinct activity sequence is processed once and weighted by its number of traces
+        metrics.progress("Calculating frequencies...")
         activity_counter = Counter()
-        combination_counter = Counter()
+        transactions = Counter()
 
-        for trace in self.event_log:
-            activities = [event['concept:name'] for event in trace]
-            activity_counter.update(activities)
-            # For simplicity, considering pairs (or customize for more combinations)
-            combinations_in_trace = chain.from_iterable(combinations(set(activities), r) for r in range(2, 3))
-            combination_counter.update(combinations_in_trace)
+        for activities, count in self.event_log:
+            for activity in activities:
+                activity_counter[activity] += count
+            transactions[frozenset(activities)] += count
 
         self.activity_frequency = dict(activity_counter)
-        self.combination_frequency = dict(combination_counter)
-        print("Frequencies calculation complete.")
+        self.combination_frequency = self.mine_combinations(transactions)
+        metrics.progress("Frequencies calculation complete.")
+
+    def calculate_frequencies_columnar(self, block_size=4096):
+        # Distinct trace activity sets are found by deduplicating the rows of the trace x activity
+        # incidence matrix, built over blocks of traces to bound memory
+        metrics.progress("Calculating frequencies...")
+        log = self.event_log
+        n_activities = len(log.activities)
+        counts = log.activity_counts()
+        trace_index = log.trace_index()
+        row_weights = Counter()
+        for start in range(0, log.n_traces, block_size):
+            stop = min(start + block_size, log.n_traces)
+            first, last = log.trace_offsets[start], log.trace_offsets[stop]
+            incidence = np.zeros((stop - start, n_activities), dtype=bool)
+            incidence[trace_index[first:last] - start, log.activity_ids[first:last]] = True
+            rows, row_counts = np.unique(np.packbits(incidence, axis=1), axis=0, return_counts=True)
+            for row, count in zip(rows, row_counts.tolist()):
+                row_weights[row.tobytes()] += count
+
+        transactions = Counter()
+        for row, count in row_weights.items():
+            members = np.flatnonzero(np.unpackbits(np.frombuffer(row, dtype=np.uint8))[:n_activities])
+            transactions[frozenset(log.activities[a] for a in members.tolist())] += count
+
+        order = log.activities_in_order().tolist()
+        self.activity_frequency = {log.activities[a]: int(counts[a]) for a in order}
+        self.combination_frequency = self.mine_combinations(transactions)
+        metrics.progress("Frequencies calculation complete.")
+
+    def calculate_frequencies_approximate(self):
+        # Streams the activity sequences of any input form through an ApproximateMultiDimPartial
+        metrics.progress("Calculating frequencies...")
+        partial = self.create_partial()
+        if isinstance(self.event_log, ColumnarEventLog):
+            log = self.event_log
+            offsets = log.trace_offsets.tolist()
+            for start, end in zip(offsets, offsets[1:]):
+                partial.update_sequence([log.activities[a] for a in log.activity_ids[start:end].tolist()])
+        elif isinstance(self.event_log, VariantIndex):
+            for activities, count in self.event_log:
+                partial.update_sequence(activities, count)
+        else:
+            for trace in self.event_log:
+                partial.update(trace)
+        self.load_partial(partial)
+        metrics.progress("Frequencies calculation complete.")
 
+    def mine_combinations(self, transactions):
+        # Level-wise (Apriori) mining of the activity combinations of size 2..max_order contained in
+        # at least min_support traces. transactions maps each distinct trace activity set to its
+        # number of traces. Supports are computed over the distinct sets with boolean masks: pairs
+        # at once with a weighted co-occurrence product, larger sizes only for candidates whose
+        # subsets are all frequent, so the work follows the number of frequent combinations.
+        combination_frequency = {}
+        if self.max_order < 2 or not transactions:
+            return combination_frequency
+        activities = sorted(set().union(*transactions))
+        position = {activity: index for index, activity in enumerate(activities)}
+        incidence = np.zeros((len(transactions), len(activities)), dtype=bool)
+        weights = np.zeros(len(transactions), dtype=np.int64)
+        for row, (activity_set, count) in enumerate(transactions.items()):
+            incidence[row, [position[activity] for activity in activity_set]] = True
+            weights[row] = count
+        min_support = self.support_threshold(int(weights.sum()))
+
+        supports = weights @ incidence
+        frequent_items = np.flatnonzero(supports >= min_support)
+        weighted = incidence[:, frequent_items].astype(np.int64)
+        co_occurrence = (weighted * weights[:, None]).T @ weighted
+        level = {}
+        rows, cols = np.nonzero(np.triu(co_occurrence >= min_support, k=1))
+        for a, b in zip(rows.tolist(), cols.tolist()):
+            level[(int(frequent_items[a]), int(frequent_items[b]))] = int(co_occurrence[a, b])
+
+        for size in range(2, self.max_order + 1):
+            for itemset, support in level.items():
+                combination_frequency[tuple(activities[item] for item in itemset)] = support
+            if size == self.max_order:
+                break
+            by_prefix = defaultdict(list)
+            for itemset in level:
+                by_prefix[itemset[:-1]].append(itemset[-1])
+            next_level = {}
+            for prefix, lasts in by_prefix.items():
+                lasts.sort()
+                prefix_mask = incidence[:, list(prefix)].all(axis=1)
+                for i, a in enumerate(lasts):
+                    mask_a = prefix_mask & incidence[:, a]
+                    for b in lasts[i + 1:]:
+                        candidate = prefix + (a, b)
+                        if any(candidate[:j] + candidate[j + 1:] not in level for j in range(len(prefix))):
+                            continue
+                        support = int(weights[mask_a & incidence[:, b]].sum())
+                        if support >= min_support:
+                            next_level[candidate] = support
+            if not next_level:
+                break
+            level = next_level
+        return combination_frequency
+
+    def support_threshold(self, n_traces):
+        # min_support as a number of traces, at least 1
+        min_support = self.min_support
+        if 0 < min_support < 1:
+            min_support = math.ceil(min_support * n_traces)
+        return max(min_support, 1)
+
+    @metrics.timed('multidim_ic')
     def calculate_information_content(self):
-        total_events = sum(self.activity_frequency.values())
-        print("Calculating Information Content...")
+        total_events = self.total_events if self.approximate else sum(self.activity_frequency.values())
+        metrics.progress("Calculating Information Content...")
         # Calculate IC for individual activities
         for activity, freq in self.activity_frequency.items():
             probability = freq / total_events
@@ -40,4 +186,286 @@ class MultiDimICCalculator:
             probability = freq / total_events
             self.IC_MultiDim[frozenset(combination)] = -math.log2(probability)
 
-        print("Information Content calculation complete.")
+        if self.approximate:
+            # Sketch estimates overcount by at most error with probability 1 - delta, so the true IC is at
+            # most the reported value plus the bound. Combinations are also left uncounted in the traces
+            # added while one of their subsets was untracked, by at most their lag, so their true IC is
+            # also at least the reported value minus log2((freq + lag) / freq). Each bound is the larger
+            # of the two: the true IC lies within it of the reported value
+            for activity, freq in self.activity_frequency.items():
+                self.IC_error_bounds[frozenset([activity])] = information_error_bound(freq, self.activity_error)
+            for combination, freq in self.combination_frequency.items():
+                undercount = math.log2((freq + self.combination_lag[combination]) / freq)
+                self.IC_error_bounds[frozenset(combination)] = max(
+                    information_error_bound(freq, self.combination_error), undercount)
+
+        metrics.progress("Information Content calculation complete.")
+
+    def create_partial(self):
+        # Empty mergeable statistics for this calculator
+        if self.approximate:
+            return ApproximateMultiDimPartial(self.max_order, **self.sketch_options)
+        return MultiDimPartial()
+
+    @metrics.timed('multidim_ic')
+    def load_partial(self, partial):
+        # Replaces the calculator's frequencies with those of a (merged) MultiDimPartial or
+        # ApproximateMultiDimPartial
+        self.IC_MultiDim = {}
+        self.IC_error_bounds = {}
+        if isinstance(partial, ApproximateMultiDimPartial):
+            min_support = self.support_threshold(partial.n_traces)
+            self.total_events = partial.activity_sketch.total
+            self.activity_frequency = partial.activity_estimates()
+            self.combination_frequency = {combination: freq for combination, freq in partial.combination_estimates().items()
+                                          if freq >= min_support}
+            self.activity_error = partial.activity_sketch.error_bound()
+            self.combination_error = partial.combination_sketch.error_bound()
+            self.combination_lag = {combination: partial.combination_lag(combination)
+                                    for combination in self.combination_frequency}
+            return
+        self.activity_frequency = dict(partial.activity_counts)
+        if partial.combination_counts is not None and partial.max_order >= self.max_order:
+            # The partial keeps the supports of the Apriori candidates current, so only the
+            # candidates it was not tracking yet are counted over the activity sets
+            min_support = self.support_threshold(sum(partial.transactions.values()))
+            self.combination_frequency = {combination: support
+                                          for combination, support in partial.frequent_combinations(min_support).items()
+                                          if len(combination) <= self.max_order}
+        else:
+            self.combination_frequency = self.mine_combinations(partial.transactions)
+
+
+class MultiDimPartial:
+    """Mergeable statistics of the multi-dimensional IC over a slice of the traces.
+
+    Holds the activity counts and the number of traces of every distinct trace
+    activity set, from which combinations of any order can be mined after merging.
+    merge is associative. Instances are plain data and can be pickled.
+
+    With max_order, the supports of the candidate combinations of the last
+    frequent_combinations call are also kept current by update and remove, so
+    that later calls do not mine the activity sets again. The candidates are the
+    frequent combinations of 2 to max_order activities and those whose smaller
+    subsets are all frequent (the negative border), as generated by Apriori, so
+    memory follows the number of frequent combinations. This is what
+    IncrementalICEngine uses. A trace costs lookups of the pairs of its frequent
+    activities plus the larger candidates extending the ones it contains. A
+    frequent_combinations call costs the Apriori candidate generation over the
+    frequent combinations, plus one pass over the distinct activity sets to count
+    the candidates that became newly needed, e.g. after a combination turned frequent.
+    """
+
+    def __init__(self, max_order=None):
+        self.activity_counts = Counter()
+        self.transactions = Counter()
+        self.max_order = max_order
+        self.combination_counts = None if max_order is None else {}  # candidate combination -> support
+        self.item_supports = Counter()  # activity -> traces containing it, maintained with max_order
+        self.frequent_items = set()  # frequent activities of the last frequent_combinations call
+        self.frequent = set()  # frequent combinations of the last frequent_combinations call
+
+    def update(self, trace):
+        activities = [event['concept:name'] for event in trace]
+        self.activity_counts.update(activities)
+        activity_set = frozenset(activities)
+        self.transactions[activity_set] += 1
+        if self.combination_counts is not None:
+            self.update_combinations(activity_set, 1)
+        return self
+
+    def update_combinations(self, activity_set, delta):
+        # Adds delta traces to the support of every candidate contained in the activity set. Candidates
+        # are closed under subsets, so they are found level by level by joining, as Apriori does, the
+        # candidates of the set sharing all but their last activity
+        self.item_supports.update(dict.fromkeys(activity_set, delta))
+        counts = self.combination_counts
+        level = [(activity,) for activity in sorted(activity_set) if activity in self.frequent_items]
+        for size in range(2, self.max_order + 1):
+            contained = []
+            for position, left in enumerate(level):
+                for right in level[position + 1:]:
+                    if left[:-1] != right[:-1]:
+                        break
+                    combination = left + right[-1:]
+                    if combination in counts:
+                        counts[combination] += delta
+                        contained.append(combination)
+            if not contained:
+                break
+            level = contained
+
+    def frequent_combinations(self, min_support):
+        """Return {combination: support} of the combinations of 2 to max_order activities (in sorted
+        order, as MultiDimICCalculator.mine_combinations) contained in at least min_support traces,
+        updating the candidates whose supports are kept current."""
+        for activity in [activity for activity, support in self.item_supports.items() if support <= 0]:
+            del self.item_supports[activity]
+        frequent_items = {activity for activity, support in self.item_supports.items() if support >= min_support}
+        frequent = {combination: support for combination, support in self.combination_counts.items()
+                    if support >= min_support}
+        if frequent_items == self.frequent_items and frequent.keys() == self.frequent:
+            # The candidates only depend on which combinations are frequent
+            return frequent
+        self.frequent_items = frequent_items
+        candidates = {}
+        frequent = {}
+        level = sorted((activity,) for activity in self.frequent_items)
+        for size in range(2, self.max_order + 1):
+            generated = []
+            for position, left in enumerate(level):
+                for right in level[position + 1:]:
+                    if left[:-1] != right[:-1]:
+                        break
+                    combination = left + right[-1:]
+                    if size == 2 or all(combination[:j] + combination[j + 1:] in frequent for j in range(size - 1)):
+                        generated.append(combination)
+            missing = [combination for combination in generated if combination not in self.combination_counts]
+            supports = self.count_supports(missing)
+            level = []
+            for combination in generated:
+                support = self.combination_counts.get(combination, supports.get(combination, 0))
+                candidates[combination] = support
+                if support >= min_support:
+                    frequent[combination] = support
+                    level.append(combination)
+            if not level:
+                break
+        self.combination_counts = candidates
+        self.frequent = set(frequent)
+        return frequent
+
+    def count_supports(self, combinations_to_count):
+        # Supports of combinations from the distinct activity sets, in one pass over them
+        supports = dict.fromkeys(combinations_to_count, 0)
+        if supports:
+            for activity_set, count in self.transactions.items():
+                for combination in supports:
+                    if activity_set.issuperset(combination):
+                        supports[combination] += count
+        return supports
+
+    def remove(self, trace):
+        activities = [event['concept:name'] for event in trace]
+        self.activity_counts.subtract(activities)
+        for activity in set(activities):
+            if self.activity_counts[activity] <= 0:
+                del self.activity_counts[activity]
+        activity_set = frozenset(activities)
+        self.transactions[activity_set] -= 1
+        if self.transactions[activity_set] <= 0:
+            del self.transactions[activity_set]
+        if self.combination_counts is not None:
+            self.update_combinations(activity_set, -1)
+        return self
+
+    def merge(self, other):
+        self.activity_counts.update(other.activity_counts)
+        self.transactions.update(other.transactions)
+        if self.combination_counts is not None:
+            for activity_set, count in other.transactions.items():
+                self.item_supports.update(dict.fromkeys(activity_set, count))
+            if other.combination_counts is not None and other.max_order == self.max_order:
+                # Candidates of both sides, whose supports are known over both slices
+                self.combination_counts = {combination: support + other.combination_counts[combination]
+                                           for combination, support in self.combination_counts.items()
+                                           if combination in other.combination_counts}
+                self.frequent_items &= other.frequent_items
+            else:
+                self.combination_counts = {}
+                self.frequent_items = set()
+            self.frequent = None
+        return self
+
+
+class ApproximateMultiDimPartial:
+    """Bounded-memory counterpart of MultiDimPartial.
+
+    Activity occurrences and, per trace, combinations of 2..max_order of its
+    distinct activities are counted in Count-Min sketches, and a HeavyHitters
+    tracker remembers which keys are frequent enough to report. Combinations are
+    grown level by level as in Apriori: a combination is counted only when all its
+    subsets one activity smaller are currently tracked, so a trace costs time in
+    the pairs of its tracked activities plus the larger combinations that extend
+    tracked ones, rather than in every C(distinct activities, k). A combination is
+    then not counted in traces seen while one of its subsets was untracked, so its
+    estimate may fall below its true count, by at most combination_lag; the
+    subsets of a frequent combination are at least as frequent and stay tracked
+    once their count exceeds the error floor. Memory is fixed by the sketch dimensions and capacity regardless of the
+    number of traces or distinct trace activity sets. merge is associative for
+    partials built with the same settings. Instances are plain data and can be
+    pickled.
+    """
+
+    def __init__(self, max_order=2, width=2048, depth=5, capacity=1000):
+        self.max_order = max_order
+        self.n_traces = 0
+        self.activity_sketch = CountMinSketch(width, depth)
+        self.activity_heavy_hitters = HeavyHitters(capacity)
+        self.combination_sketch = CountMinSketch(width, depth)
+        self.combination_heavy_hitters = HeavyHitters(capacity)
+
+    @property
+    def activity_counts(self):
+        # Estimated occurrences of the tracked activities, in order of first appearance
+        return self.activity_estimates()
+
+    def update(self, trace):
+        return self.update_sequence([event['concept:name'] for event in trace])
+
+    def update_sequence(self, activities, count=1):
+        # Adds count traces following the activity sequence
+        self.n_traces += count
+        for activity, occurrences in Counter(activities).items():
+            self.activity_sketch.add(activity, occurrences * count)
+            self.activity_heavy_hitters.add(activity, occurrences * count)
+        tracked = self.combination_heavy_hitters.counts
+        level = [(activity,) for activity in sorted(set(activities)) if activity in self.activity_heavy_hitters.counts]
+        for size in range(2, self.max_order + 1):
+            # Join tracked combinations sharing all but their last activity; level stays sorted
+            candidates = []
+            for position, left in enumerate(level):
+                for right in level[position + 1:]:
+                    if left[:-1] != right[:-1]:
+                        break
+                    combination = left + right[-1:]
+                    if size == 2 or all(subset in tracked for subset in combinations(combination, size - 1)):
+                        candidates.append(combination)
+            for combination in candidates:
+                self.combination_sketch.add(combination, count)
+                self.combination_heavy_hitters.add(combination, count)
+            tracked = self.combination_heavy_hitters.counts
+            level = [combination for combination in candidates if combination in tracked]
+            if not level:
+                break
+        return self
+
+    def remove(self, trace):
+        raise ValueError("heavy-hitter tracking cannot be undone; use exact counting for windowed updates")
+
+    def merge(self, other):
+        self.n_traces += other.n_traces
+        self.activity_sketch.merge(other.activity_sketch)
+        self.activity_heavy_hitters.merge(other.activity_heavy_hitters)
+        self.combination_sketch.merge(other.combination_sketch)
+        self.combination_heavy_hitters.merge(other.combination_heavy_hitters)
+        return self
+
+    def activity_estimates(self):
+        return {activity: self.activity_sketch.estimate(activity) for activity in self.activity_heavy_hitters}
+
+    def combination_lag(self, combination):
+        # Upper bound of the traces containing a combination that were added while one of its subsets
+        # was untracked. A key's occurrences before it was last tracked are at most its heavy-hitter
+        # error, and those of an untracked key at most the floor
+        lag = 0
+        for size in range(1, len(combination)):
+            tracker = self.activity_heavy_hitters if size == 1 else self.combination_heavy_hitters
+            for subset in combinations(combination, size):
+                entry = tracker.counts.get(subset[0] if size == 1 else subset)
+                lag += tracker.floor if entry is None else entry[1]
+        return lag
+
+    def combination_estimates(self):
+        return {combination: self.combination_sketch.estimate(combination)
+                for combination in self.combination_heavy_hitters}
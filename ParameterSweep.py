@@ -0,0 +1,100 @@
+import itertools
+
+import numpy as np
+
+from Instrumentation import metrics
+
+RELATION_TYPES = np.array([None, 'sequence', 'parallel', 'choice'], dtype=object)
+
+
+def lambda_components(engine):
+    """Derive the IC dimensions of every activity once, with lambda = 1.
+
+    The temporal and contextual IC are lambda times a log-probability, and the
+    multi-dimensional and uncertainty IC do not depend on lambda, so the IIC at
+    any lambda is (lambda * temporal + lambda * contextual + multidim - uncertainty) / 4.
+
+    Args:
+        engine (FusedICEngine): Engine holding the statistics of the log.
+
+    Returns:
+        tuple: (activities in order of first appearance, numpy arrays of their temporal and
+            contextual IC at lambda = 1, multi-dimensional IC and uncertainty IC).
+    """
+    lambda_val = engine.lambda_val
+    engine.lambda_val = engine.contextual.lambda_val = 1
+    try:
+        results = engine.compute()
+    finally:
+        engine.lambda_val = engine.contextual.lambda_val = lambda_val
+    activities = list(engine.activity_counts)
+    temporal = np.array([results['IC_Temporal'].get(activity, 0) for activity in activities], dtype=float)
+    contextual = np.array([results['IC_Contextual'].get(activity, 0) for activity in activities], dtype=float)
+    multidim = np.array([results['IC_MultiDim'].get(frozenset([activity]), 0) for activity in activities], dtype=float)
+    uncertainty = np.array([results['IC_Uncertainty'].get(activity, 0) for activity in activities], dtype=float)
+    return activities, temporal, contextual, multidim, uncertainty
+
+
+@metrics.timed('parameter_sweep')
+def sweep_parameters(engine, lambda_values, sequence_thresholds=(0.2,), parallel_thresholds_max=(1.0,),
+                     choice_thresholds=(1.0,)):
+    """Evaluate the IIC ranking and inferred relationships over a grid of lambda and thresholds.
+
+    The statistics are turned into IC values once; the IIC of every activity for
+    every lambda is then one broadcast product, every ranking one argsort, and the
+    relation types of every threshold combination one comparison of the IIC
+    differences, so the cost of the grid is close to that of a single run. Results
+    match improved_information_content_algorithm and infer_relationships run at each
+    point, including the order of activities with equal IIC.
+
+    Args:
+        engine (FusedICEngine): Engine holding the statistics of the log, e.g. Pipeline.statistics().
+        lambda_values (iterable): Values of lambda to evaluate.
+        sequence_thresholds (iterable): Values of sequence_threshold.
+        parallel_thresholds_max (iterable): Values of parallel_threshold_max.
+        choice_thresholds (iterable): Values of choice_threshold.
+
+    Returns:
+        list: One dict per point of the grid (lambdas outermost), with lambda_val,
+            sequence_threshold, parallel_threshold_max, choice_threshold, parsed_log
+            (the IIC ranking) and inferred_relationships.
+    """
+    activities, temporal, contextual, multidim, uncertainty = lambda_components(engine)
+    lambdas = np.asarray(list(lambda_values), dtype=float)
+    thresholds = np.array(list(itertools.product(sequence_thresholds, parallel_thresholds_max, choice_thresholds)),
+                          dtype=float).reshape(-1, 3)
+
+    # lambda x activity IIC matrix, summed in the same order as improved_information_content_algorithm
+    lambda_column = lambdas[:, None]
+    iic = (lambda_column * temporal + lambda_column * contextual + multidim + -uncertainty) / 4
+    order = np.argsort(-iic, axis=1, kind='stable')
+    ranked = np.take_along_axis(iic, order, axis=1)
+    differences = np.abs(ranked[:, 1:] - ranked[:, :-1])
+
+    # lambda x threshold combination x adjacent pair relation codes (0: none), as in infer_relationships
+    sequence, parallel, choice = (thresholds[:, column][None, :, None] for column in range(3))
+    gap = differences[:, None, :]
+    codes = np.where(gap <= sequence, 1,
+                     np.where(gap <= parallel, 2,
+                              np.where(gap > choice, 3, 0)))
+
+    names = np.array(activities, dtype=object)
+    points = []
+    for lambda_index, lambda_val in enumerate(lambdas.tolist()):
+        ranked_names = names[order[lambda_index]].tolist()
+        parsed_log = list(zip(ranked_names, ranked[lambda_index].tolist()))
+        for threshold_index, (sequence_threshold, parallel_threshold_max, choice_threshold) in enumerate(thresholds.tolist()):
+            row = codes[lambda_index, threshold_index]
+            kept = np.flatnonzero(row)
+            relations = RELATION_TYPES[row[kept]].tolist()
+            inferred_relationships = [(ranked_names[i], ranked_names[i + 1], relation)
+                                      for i, relation in zip(kept.tolist(), relations)]
+            points.append({
+                'lambda_val': lambda_val,
+                'sequence_threshold': sequence_threshold,
+                'parallel_threshold_max': parallel_threshold_max,
+                'choice_threshold': choice_threshold,
+                'parsed_log': parsed_log,
+                'inferred_relationships': inferred_relationships,
+            })
+    return points
@@ -0,0 +1,39 @@
+import os
+
+from pm4py.visualization.petri_net import visualizer as pn_visualizer
+
+from Instrumentation import metrics
+from PetriNetModel import PetriNet, build_native_petri_net, to_pm4py
+
+
+def build_petri_net(inferred_relationships, name="Constructed Net"):
+    """Construct a Petri net from inferred activity relationships, as pm4py objects.
+
+    The net is built by PetriNetModel.build_native_petri_net and converted; use that
+    function directly to avoid importing pm4py.
+
+    Args:
+        inferred_relationships (list): (activity, next activity, relation type) tuples,
+            as returned by ProcessDiscovery.infer_relationships.
+        name (str): Name of the net.
+
+    Returns:
+        tuple: (net, initial marking, final marking).
+    """
+    return to_pm4py(*build_native_petri_net(inferred_relationships, name))
+
+
+@metrics.timed('render')
+def render_petri_net(net, initial_marking, final_marking, output_path, view=False):
+    """Render a Petri net to a file whose format follows its suffix (pdf, png, svg, ...), optionally opening it.
+
+    A PetriNetModel.PetriNet is converted to pm4py objects first.
+    """
+    if isinstance(net, PetriNet):
+        net, initial_marking, final_marking = to_pm4py(net, initial_marking, final_marking)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    parameters = {'format': os.path.splitext(output_path)[1].lstrip('.') or 'pdf', 'debug': False, 'show_labels': True}
+    gviz = pn_visualizer.apply(net, initial_marking, final_marking, parameters=parameters)
+    pn_visualizer.save(gviz, output_path)
+    if view:
+        pn_visualizer.view(gviz)
@@ -0,0 +1,352 @@
+from collections import Counter
+from xml.sax.saxutils import escape, quoteattr
+
+from Instrumentation import metrics
+
+
+class Place:
+    __slots__ = ('index', 'name')
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+
+    def __repr__(self):
+        return f'Place({self.name!r})'
+
+
+class Transition:
+    __slots__ = ('index', 'name', 'label')
+
+    def __init__(self, index, name, label):
+        self.index = index
+        self.name = name
+        self.label = label
+
+    def __repr__(self):
+        return f'Transition({self.name!r}, {self.label!r})'
+
+
+class PetriNet:
+    """Lightweight Petri net with adjacency indexes, independent of pm4py.
+
+    Places and transitions are numbered in creation order and every arc is
+    indexed on both of its ends, so pre-sets and post-sets are list lookups.
+    Adding an arc that already exists has no effect. A transition labelled None
+    is silent (it matches no event). Markings are dictionaries from Place to
+    number of tokens.
+
+    Attributes:
+        name (str): Name of the net.
+        places (list): Places, by index.
+        transitions (list): Transitions, by index.
+        arcs (list): (source, target) node pairs, in creation order.
+        place_inputs (list): Per place index, the transitions with an arc into it.
+        place_outputs (list): Per place index, the transitions it has an arc to.
+        transition_inputs (list): Per transition index, its input places (pre-set).
+        transition_outputs (list): Per transition index, its output places (post-set).
+    """
+
+    def __init__(self, name="Constructed Net"):
+        self.name = name
+        self.places = []
+        self.transitions = []
+        self.arcs = []
+        self.place_inputs = []
+        self.place_outputs = []
+        self.transition_inputs = []
+        self.transition_outputs = []
+        self._arc_set = set()
+
+    def add_place(self, name=None):
+        place = Place(len(self.places), name if name else f'p{len(self.places)}')
+        self.places.append(place)
+        self.place_inputs.append([])
+        self.place_outputs.append([])
+        return place
+
+    def add_transition(self, label, name=None):
+        transition = Transition(len(self.transitions), name if name else f't{len(self.transitions)}', label)
+        self.transitions.append(transition)
+        self.transition_inputs.append([])
+        self.transition_outputs.append([])
+        return transition
+
+    def add_arc(self, source, target):
+        key = (type(source), source.index, target.index)
+        if key in self._arc_set:
+            return
+        self._arc_set.add(key)
+        self.arcs.append((source, target))
+        if isinstance(source, Place):
+            self.place_outputs[source.index].append(target)
+            self.transition_inputs[target.index].append(source)
+        else:
+            self.transition_outputs[source.index].append(target)
+            self.place_inputs[target.index].append(source)
+
+    def transitions_by_label(self):
+        """Return label to the transitions carrying it."""
+        by_label = {}
+        for transition in self.transitions:
+            by_label.setdefault(transition.label, []).append(transition)
+        return by_label
+
+
+@metrics.timed('petri_net')
+def build_native_petri_net(inferred_relationships, name="Constructed Net"):
+    """Construct a Petri net from inferred activity relationships in linear time.
+
+    Builds the same structure as the original construction: a pair of fresh
+    transitions per sequence relation, a fresh transition per activity of a
+    parallel or choice group, one "End" transition and start and end places. The
+    later relations of a parallel or choice group and the sources of all but the
+    last relation are found through indexes built in one pass instead of
+    rescanning the relationship list.
+
+    Args:
+        inferred_relationships (list): (activity, next activity, relation type) tuples,
+            as returned by ProcessDiscovery.infer_relationships.
+        name (str): Name of the net.
+
+    Returns:
+        tuple: (PetriNet, initial marking, final marking).
+    """
+    net = PetriNet(name)
+    start_place = net.add_place("start")
+    initial_marking = {start_place: 1}
+    last_places = {}
+
+    # later_counts[i]: relations after i with the same source activity and type, counted backwards
+    later_counts = [0] * len(inferred_relationships)
+    seen = Counter()
+    for i in range(len(inferred_relationships) - 1, -1, -1):
+        activity, _, rel_type = inferred_relationships[i]
+        later_counts[i] = seen[activity, rel_type]
+        seen[activity, rel_type] += 1
+
+    for i, (activity, next_activity, rel_type) in enumerate(inferred_relationships):
+        if rel_type == 'sequence':
+            source_transition = net.add_transition(activity)
+            net.add_arc(last_places.get(activity, start_place), source_transition)
+            target_place = net.add_place()
+            net.add_arc(source_transition, target_place)
+            target_transition = net.add_transition(next_activity)
+            net.add_arc(target_place, target_transition)
+            next_place = net.add_place()
+            net.add_arc(target_transition, next_place)
+            last_places[next_activity] = next_place
+        elif rel_type in ('parallel', 'choice'):
+            # The group holds next_activity, then the source activity once per later relation of the
+            # same type from it, as in the original construction
+            split_place = last_places.get(activity, start_place)
+            for group_activity in [next_activity] + [activity] * later_counts[i]:
+                transition = net.add_transition(group_activity)
+                net.add_arc(split_place, transition)
+                place = net.add_place()
+                net.add_arc(transition, place)
+                last_places[group_activity] = place
+
+    targets = {next_activity for _, next_activity, _ in inferred_relationships}
+    end_activities = [activity for activity in dict.fromkeys(activity for activity, _, _ in inferred_relationships)
+                      if activity not in targets]
+    non_final_sources = {activity for activity, _, _ in inferred_relationships[:-1]}
+
+    final_transition = net.add_transition("End")
+    for activity, place in last_places.items():
+        if activity not in non_final_sources:
+            net.add_arc(place, final_transition)
+    for activity in end_activities:
+        if activity in last_places:
+            net.add_arc(last_places[activity], final_transition)
+
+    end_place = net.add_place("end")
+    net.add_arc(final_transition, end_place)
+    final_marking = {end_place: 1}
+    return net, initial_marking, final_marking
+
+
+@metrics.timed('petri_net')
+def build_directly_follows_petri_net(inferred_relationships, start_activities=None, end_activities=None,
+                                     name="Constructed Net"):
+    """Construct a Petri net with one transition per activity from causal relations.
+
+    Meant for the relations of DirectlyFollowsDiscovery, which list every successor
+    of an activity. Each activity has an input and an output place, and every
+    relation (a, b) is a silent transition moving a token from the output side of
+    a to the input side of b, so successors of a sharing its output place form an
+    XOR-split. The 'parallel' successors of a are taken out of that place by one
+    silent AND-split, with a place per branch. Predecessors of b that are parallel
+    successors of a common activity are treated as concurrent and synchronised by
+    a silent AND-join before b; other predecessors are alternatives (XOR-join).
+    Start activities are fed from the start place and end activities lead to the
+    "End" transition. Self-loops are ignored.
+
+    Args:
+        inferred_relationships (list): (activity, next activity, relation type) tuples.
+        start_activities (iterable): Activities that begin traces; by default those without predecessor.
+        end_activities (iterable): Activities that end traces; by default those without successor.
+        name (str): Name of the net.
+
+    Returns:
+        tuple: (PetriNet, initial marking, final marking).
+    """
+    activities = list(dict.fromkeys(activity for relation in inferred_relationships for activity in relation[:2]))
+    successors = {activity: {} for activity in activities}
+    predecessors = {activity: {} for activity in activities}
+    parallel_targets = {activity: {} for activity in activities}
+    for activity, next_activity, rel_type in inferred_relationships:
+        if activity == next_activity:
+            continue
+        successors[activity][next_activity] = None
+        predecessors[next_activity][activity] = None
+        if rel_type == 'parallel':
+            parallel_targets[activity][next_activity] = None
+    if start_activities is None:
+        start_activities = [activity for activity in activities if not predecessors[activity]]
+    if end_activities is None:
+        end_activities = [activity for activity in activities if not successors[activity]]
+    for activity in list(start_activities) + list(end_activities):
+        if activity not in successors:
+            activities.append(activity)
+            successors[activity], predecessors[activity], parallel_targets[activity] = {}, {}, {}
+
+    # Activities known to be concurrent: parallel successors of a common activity
+    concurrent = {activity: set() for activity in activities}
+    for targets in parallel_targets.values():
+        for target in targets:
+            concurrent[target].update(other for other in targets if other != target)
+
+    net = PetriNet(name)
+    start_place = net.add_place("start")
+    input_places, output_places = {}, {}
+    for activity in activities:
+        transition = net.add_transition(activity)
+        input_places[activity] = net.add_place()
+        net.add_arc(input_places[activity], transition)
+        output_places[activity] = net.add_place()
+        net.add_arc(transition, output_places[activity])
+
+    def route(source_place, target_place):
+        silent = net.add_transition(None)
+        net.add_arc(source_place, silent)
+        net.add_arc(silent, target_place)
+
+    # Place each relation delivers its token to: the input place of the target, or a branch of its AND-join
+    entries = {}
+    for activity in activities:
+        groups = []
+        for predecessor in predecessors[activity]:
+            group = next((group for group in groups if concurrent[predecessor] & set(group)), None)
+            if group is None:
+                groups.append([predecessor])
+            else:
+                group.append(predecessor)
+        for group in groups:
+            if len(group) == 1:
+                entries[group[0], activity] = input_places[activity]
+                continue
+            join = net.add_transition(None)
+            net.add_arc(join, input_places[activity])
+            for predecessor in group:
+                branch = net.add_place()
+                net.add_arc(branch, join)
+                entries[predecessor, activity] = branch
+
+    for activity in activities:
+        exits = {}
+        if len(parallel_targets[activity]) > 1:
+            split = net.add_transition(None)
+            net.add_arc(output_places[activity], split)
+            for target in parallel_targets[activity]:
+                exits[target] = net.add_place()
+                net.add_arc(split, exits[target])
+        for target in successors[activity]:
+            route(exits.get(target, output_places[activity]), entries[activity, target])
+
+    for activity in dict.fromkeys(start_activities):
+        route(start_place, input_places[activity])
+    completion_place = net.add_place()
+    for activity in dict.fromkeys(end_activities):
+        route(output_places[activity], completion_place)
+    final_transition = net.add_transition("End")
+    net.add_arc(completion_place, final_transition)
+    end_place = net.add_place("end")
+    net.add_arc(final_transition, end_place)
+    return net, {start_place: 1}, {end_place: 1}
+
+
+def write_pnml(net, initial_marking, final_marking, path):
+    """Write a net as PNML, element by element, without building the document in memory."""
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write('<?xml version="1.0" encoding="UTF-8"?>\n<pnml>\n'
+                     '<net id="net1" type="http://www.pnml.org/version-2009/grammar/pnmlcoremodel">\n'
+                     f'<name><text>{escape(net.name)}</text></name>\n<page id="n0">\n')
+        for place in net.places:
+            output.write(f'<place id={quoteattr(place.name)}><name><text>{escape(place.name)}</text></name>')
+            if initial_marking.get(place):
+                output.write(f'<initialMarking><text>{initial_marking[place]}</text></initialMarking>')
+            output.write('</place>\n')
+        for transition in net.transitions:
+            output.write(f'<transition id={quoteattr(transition.name)}>')
+            if transition.label is None:
+                output.write(f'<name><text>{escape(transition.name)}</text></name>'
+                             '<toolspecific tool="ProM" version="6.4" activity="$invisible$"/></transition>\n')
+            else:
+                output.write(f'<name><text>{escape(str(transition.label))}</text></name></transition>\n')
+        for index, (source, target) in enumerate(net.arcs):
+            output.write(f'<arc id="a{index}" source={quoteattr(source.name)} target={quoteattr(target.name)}/>\n')
+        output.write('</page>\n<finalmarkings>\n<marking>\n')
+        for place, tokens in final_marking.items():
+            output.write(f'<place idref={quoteattr(place.name)}><text>{tokens}</text></place>\n')
+        output.write('</marking>\n</finalmarkings>\n</net>\n</pnml>\n')
+
+
+def dot_quote(text):
+    """Quote a string as a Graphviz DOT identifier."""
+    return '"' + str(text).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def write_dot(net, initial_marking, final_marking, path):
+    """Write a net in Graphviz DOT format, element by element."""
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(f'digraph {dot_quote(net.name)} {{\nrankdir=LR;\n')
+        for place in net.places:
+            tokens = initial_marking.get(place, 0)
+            label = '\u25cf' if tokens == 1 else (str(tokens) if tokens else '')
+            shape = 'doublecircle' if place in final_marking else 'circle'
+            output.write(f'{dot_quote(place.name)} [shape={shape}, label={dot_quote(label)}];\n')
+        for transition in net.transitions:
+            if transition.label is None:
+                output.write(f'{dot_quote(transition.name)} [shape=box, style=filled, fillcolor=black, label=""];\n')
+            else:
+                output.write(f'{dot_quote(transition.name)} [shape=box, label={dot_quote(transition.label)}];\n')
+        for source, target in net.arcs:
+            output.write(f'{dot_quote(source.name)} -> {dot_quote(target.name)};\n')
+        output.write('}\n')
+
+
+def to_pm4py(net, initial_marking, final_marking):
+    """Convert a net and its markings to pm4py objects (imports pm4py)."""
+    from pm4py.objects.petri_net.obj import Marking, PetriNet as Pm4pyPetriNet
+    from pm4py.objects.petri_net.utils import petri_utils
+
+    pm4py_net = Pm4pyPetriNet(net.name)
+    places = []
+    for place in net.places:
+        pm4py_place = Pm4pyPetriNet.Place(place.name)
+        pm4py_net.places.add(pm4py_place)
+        places.append(pm4py_place)
+    transitions = []
+    for transition in net.transitions:
+        pm4py_transition = Pm4pyPetriNet.Transition(transition.name, transition.label)
+        pm4py_net.transitions.add(pm4py_transition)
+        transitions.append(pm4py_transition)
+    for source, target in net.arcs:
+        if isinstance(source, Place):
+            petri_utils.add_arc_from_to(places[source.index], transitions[target.index], pm4py_net)
+        else:
+            petri_utils.add_arc_from_to(transitions[source.index], places[target.index], pm4py_net)
+    pm4py_initial = Marking({places[place.index]: tokens for place, tokens in initial_marking.items()})
+    pm4py_final = Marking({places[place.index]: tokens for place, tokens in final_marking.items()})
+    return pm4py_net, pm4py_initial, pm4py_final
@@ -0,0 +1,336 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from ColumnarEventLog import encode_timestamp
+from DirectlyFollowsDiscovery import DirectlyFollowsGraph, infer_directly_follows_relationships
+from EventLogCache import EventLogCache
+from FusedICEngine import FusedICEngine
+from IIC import improved_information_content_algorithm
+from Instrumentation import metrics
+from ParameterSweep import sweep_parameters
+from PetriNetModel import build_directly_follows_petri_net, build_native_petri_net, write_dot, write_pnml
+from TokenReplay import TokenReplayer
+from ProcessDiscovery import infer_relationships
+from VariantIndex import VariantIndex
+from XESParser import XESParser
+
+STAGE_CACHE_VERSION = 9
+
+
+class Pipeline:
+    """Process discovery pipeline with stage-level result caching.
+
+    The stages are parse -> statistics -> ic (the four IC dimensions) -> iic ->
+    relationships -> model -> render. The parse stage keeps the activity sequences
+    of the parsed traces, in file and in timestamp order; the statistics are
+    computed from the traces themselves. With discovery='directly_follows' the
+    relationships are inferred from a parse -> directly_follows count matrix
+    instead, optionally weighted by the IIC ranking. The conformance stage replays
+    the parsed sequences on the model to score its fitness and precision. Each stage's output is pickled under
+    cache_dir with a key derived from the key of the stage it consumes and from
+    its own parameters; the parse key covers the name, size and modification time
+    of every source file. Stages are evaluated lazily from the end: asking for the
+    model after changing a discovery threshold loads the cached IIC ranking and
+    only re-runs relationship inference and model construction, without parsing
+    or scoring the log again. Parsed files are also kept in an EventLogCache under
+    cache_dir, for when the statistics have to be rebuilt. Stage outputs are also
+    kept in memory for the lifetime of the pipeline, with or without cache_dir, so
+    a run computes every stage at most once.
+
+    Attributes:
+        xes_dir_path (str): Directory holding the XES files.
+        parse_options (dict): sample_size, stratify_by and seed of a stratified sample (see
+            XESParser.sample_all_xes_files), or max_traces to keep the first traces instead
+            (sample_size None), and attribute_keys. max_traces takes precedence over sample_size;
+            with both None the whole log is parsed. attribute_keys, when given, is extended with
+            the keys the IC dimensions read (FusedICEngine.attribute_keys) and every other
+            attribute is skipped while parsing; the uncertainty IC then only scores the kept ones.
+        parse_workers (int): Processes parsing the files when they are not sampled; the parsed
+            log does not depend on it, so it is not part of any cache key.
+        engine_options (dict): Options of FusedICEngine (window, max_order, ...).
+        lambda_val (float): Scaling factor of the temporal and contextual IC.
+        thresholds (dict): sequence_threshold, parallel_threshold_max and choice_threshold.
+        discovery (dict): mode ('iic' or 'directly_follows') and the options of directly-follows
+            discovery: dependency_threshold, min_frequency, iic_weight (see
+            DirectlyFollowsDiscovery.infer_directly_follows_relationships) and by_timestamp.
+        cache_dir (str): Directory of the stage cache, or None to disable caching.
+    """
+
+    def __init__(self, xes_dir_path='./Data', max_traces=None, sample_size=100, stratify_by='variant', seed=0,
+                 attribute_keys=None, parse_workers=1, lambda_val=0.5, sequence_threshold=0.2, parallel_threshold_max=1.0,
+                 choice_threshold=1.0, discovery='iic', dependency_threshold=0.5, min_frequency=0.0, iic_weight=0.0,
+                 by_timestamp=False, cache_dir='./.pipeline_cache', **engine_options):
+        self.xes_dir_path = xes_dir_path
+        if max_traces is not None:
+            sample_size = None
+        if attribute_keys is not None:
+            attribute_keys = set(attribute_keys) | FusedICEngine(lambda_val, **engine_options).attribute_keys()
+        self.parse_options = {'max_traces': max_traces, 'sample_size': sample_size, 'stratify_by': stratify_by,
+                              'seed': seed, 'attribute_keys': None if attribute_keys is None else sorted(attribute_keys)}
+        self.parse_workers = parse_workers
+        self.engine_options = engine_options
+        self.lambda_val = lambda_val
+        self.thresholds = {'sequence_threshold': sequence_threshold, 'parallel_threshold_max': parallel_threshold_max,
+                           'choice_threshold': choice_threshold}
+        if discovery not in ('iic', 'directly_follows'):
+            raise ValueError(f"Unknown discovery mode: {discovery}")
+        self.discovery = {'mode': discovery, 'dependency_threshold': dependency_threshold,
+                          'min_frequency': min_frequency, 'iic_weight': iic_weight, 'by_timestamp': by_timestamp}
+        self.cache_dir = cache_dir
+        self._keys = {}
+        self._outputs = {}  # stage key -> output computed or loaded by this pipeline
+        self._traces = None
+
+    def parser(self):
+        cache = None if self.cache_dir is None else EventLogCache(os.path.join(self.cache_dir, 'xes'))
+        return XESParser(self.xes_dir_path, attribute_keys=self.parse_options['attribute_keys'], cache=cache)
+
+    def source_fingerprint(self):
+        """Name, size and modification time of every source file."""
+        fingerprint = []
+        for file_name in XESParser(self.xes_dir_path).list_xes_files():
+            stat = os.stat(os.path.join(self.xes_dir_path, file_name))
+            fingerprint.append([file_name, stat.st_size, stat.st_mtime_ns])
+        return fingerprint
+
+    def stage_key(self, stage):
+        """Cache key of a stage's output, chained through the keys of the stages it consumes."""
+        if stage not in self._keys:
+            if stage == 'parse':
+                inputs = [os.path.abspath(self.xes_dir_path), self.source_fingerprint(), self.parse_options]
+            elif stage == 'statistics':
+                inputs = [self.stage_key('parse'), self.engine_options]
+            elif stage == 'ic':
+                inputs = [self.stage_key('statistics'), self.lambda_val]
+            elif stage == 'iic':
+                inputs = [self.stage_key('ic')]
+            elif stage == 'directly_follows':
+                inputs = [self.stage_key('parse'), self.discovery['by_timestamp']]
+            elif stage == 'relationships' and self.discovery['mode'] == 'iic':
+                inputs = [self.stage_key('iic'), self.thresholds]
+            elif stage == 'relationships':
+                weighted = bool(self.discovery['iic_weight'])
+                inputs = [self.stage_key('directly_follows'), self.discovery, self.stage_key('iic') if weighted else None]
+            elif stage == 'conformance':
+                inputs = [self.stage_key('model'), self.stage_key('parse')]
+            else:
+                inputs = [self.stage_key('relationships')]
+            encoded = json.dumps([STAGE_CACHE_VERSION, stage, inputs], sort_keys=True, default=repr)
+            self._keys[stage] = hashlib.sha1(encoded.encode()).hexdigest()
+        return self._keys[stage]
+
+    def cached(self, stage, compute):
+        """Return the output of a stage from memory or the stage cache, computing and storing it on a miss."""
+        key = self.stage_key(stage)
+        if key in self._outputs:
+            return self._outputs[key]
+        self._outputs[key] = output = self.load_or_compute(stage, key, compute)
+        return output
+
+    def load_or_compute(self, stage, key, compute):
+        if self.cache_dir is None:
+            return compute()
+        path = os.path.join(self.cache_dir, 'stages', f'{stage}-{key}.pkl')
+        if os.path.exists(path):
+            metrics.count('stage_cache_hits')
+            metrics.progress(f"Loaded the {stage} stage from the cache.")
+            with open(path, 'rb') as cached_file:
+                return pickle.load(cached_file)
+        output = compute()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, staging_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.staging-')
+        with os.fdopen(descriptor, 'wb') as staging_file:
+            pickle.dump(output, staging_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging_path, path)
+        return output
+
+    def traces(self):
+        """The parsed traces, read at most once per pipeline and never pickled: the stages built from them are."""
+        if self._traces is None:
+            parser = self.parser()
+            if self.parse_options['sample_size'] is not None:
+                self._traces = parser.sample_all_xes_files(self.parse_options['sample_size'],
+                                                           self.parse_options['stratify_by'], self.parse_options['seed'])
+            else:
+                self._traces = parser.process_all_xes_files(max_traces=self.parse_options['max_traces'],
+                                                            workers=self.parse_workers)
+        return self._traces
+
+    def parse(self):
+        """VariantIndex of the parsed traces in file order ('variants') and with the events of every trace
+        ordered by time:timestamp, stably and events without one first ('timestamp_variants')."""
+        def compute():
+            variants, timestamp_variants = VariantIndex(), VariantIndex()
+            for trace in self.traces():
+                variants.add(trace)
+                timestamp_variants.add(sorted(trace, key=lambda event: encode_timestamp(event.get('time:timestamp'))))
+            return {'variants': variants, 'timestamp_variants': timestamp_variants}
+        return self.cached('parse', compute)
+
+    def statistics(self):
+        """FusedICEngine holding the statistics of the parsed traces."""
+        return self.cached('statistics', lambda: FusedICEngine(self.lambda_val, **self.engine_options).consume(self.traces()))
+
+    def ic(self):
+        """The four IC dictionaries and their error bounds, with the activities in order of first appearance."""
+        def compute():
+            engine = self.statistics()
+            engine.lambda_val = engine.contextual.lambda_val = self.lambda_val
+            results = engine.compute()
+            del results['parsed_log'], results['IIC_error_bounds']
+            results['activities'] = list(engine.activity_counts)
+            return results
+        return self.cached('ic', compute)
+
+    def iic(self):
+        """Activities ranked by IIC."""
+        def compute():
+            results = self.ic()
+            return improved_information_content_algorithm(None, results['IC_Temporal'], results['IC_Contextual'],
+                                                          results['IC_MultiDim'], results['IC_Uncertainty'],
+                                                          activities=results['activities'])
+        return self.cached('iic', compute)
+
+    def directly_follows(self):
+        """DirectlyFollowsGraph of the parsed traces."""
+        order = 'timestamp_variants' if self.discovery['by_timestamp'] else 'variants'
+        return self.cached('directly_follows', lambda: DirectlyFollowsGraph.from_variants(self.parse()[order]))
+
+    def relationships(self):
+        """(activity, next activity, relation type) tuples inferred from the IIC ranking or the directly-follows graph."""
+        if self.discovery['mode'] == 'iic':
+            return self.cached('relationships', lambda: infer_relationships(self.iic(), **self.thresholds))
+
+        def compute():
+            options = dict(self.discovery)
+            del options['mode'], options['by_timestamp']
+            parsed_log = self.iic() if options['iic_weight'] else None
+            return infer_directly_follows_relationships(self.directly_follows(), parsed_log=parsed_log, **options)
+        return self.cached('relationships', compute)
+
+    def model(self):
+        """(PetriNetModel.PetriNet, initial marking, final marking) built from the inferred relationships.
+
+        Directly-follows relations list every successor of an activity, so they are built with one
+        transition per activity and explicit AND/XOR splits (build_directly_follows_petri_net).
+        """
+        if self.discovery['mode'] == 'iic':
+            return self.cached('model', lambda: build_native_petri_net(self.relationships()))
+
+        def compute():
+            graph = self.directly_follows()
+            starts = [graph.activities[a] for a in graph.start_counts.nonzero()[0].tolist()]
+            ends = [graph.activities[a] for a in graph.end_counts.nonzero()[0].tolist()]
+            return build_directly_follows_petri_net(self.relationships(), starts, ends)
+        return self.cached('model', compute)
+
+    def conformance(self, workers=1):
+        """Fitness and precision of the model on the parsed traces (see TokenReplay.TokenReplayer.replay)."""
+        return self.cached('conformance', lambda: TokenReplayer(*self.model()).replay(self.parse()['variants'], workers))
+
+    def render(self, output_path, view=False):
+        """Write the model to output_path; never cached, as the file is the output.
+
+        .pnml and .dot (or .gv) files are streamed out directly; any other suffix
+        is rendered by pm4py's visualizer in that format.
+        """
+        suffix = os.path.splitext(output_path)[1].lower()
+        if suffix in ('.pnml', '.dot', '.gv'):
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            (write_pnml if suffix == '.pnml' else write_dot)(*self.model(), output_path)
+            return
+        from PetriNetConstruction import render_petri_net  # needs pm4py
+        render_petri_net(*self.model(), output_path, view=view)
+
+    def sweep(self, lambda_values, sequence_thresholds=(0.2,), parallel_thresholds_max=(1.0,), choice_thresholds=(1.0,)):
+        """IIC ranking and inferred relationships over a parameter grid, from the cached statistics.
+
+        See ParameterSweep.sweep_parameters.
+        """
+        return sweep_parameters(self.statistics(), lambda_values, sequence_thresholds, parallel_thresholds_max,
+                                choice_thresholds)
+
+    def run(self, render_path=None, view=False, conformance=False, workers=1):
+        """Run the pipeline up to the model, rendering it when render_path is given.
+
+        Returns:
+            dict: parsed_log (the IIC ranking), inferred_relationships and model, and
+                conformance when requested.
+        """
+        if render_path is not None:
+            self.render(render_path, view)
+        results = {'parsed_log': self.iic(), 'inferred_relationships': self.relationships(), 'model': self.model()}
+        if conformance:
+            results['conformance'] = self.conformance(workers)
+        return results
+
+
+def main(argv=None):
+    argument_parser = argparse.ArgumentParser(description="Discover a Petri net from XES event logs.")
+    argument_parser.add_argument('xes_dir_path', nargs='?', default='./Data', help="directory of the .xes files")
+    argument_parser.add_argument('--sample-size', type=int, default=100, help="number of traces sampled over all files")
+    argument_parser.add_argument('--stratify-by', choices=['variant', 'file', 'none'], default='variant')
+    argument_parser.add_argument('--max-traces', type=int, help="keep the first traces in directory order instead of sampling")
+    argument_parser.add_argument('--all-traces', action='store_true', help="parse the whole log instead of sampling")
+    argument_parser.add_argument('--parse-workers', type=int, default=1,
+                                 help="processes parsing the files with --max-traces or --all-traces, 0 for one per CPU")
+    argument_parser.add_argument('--attribute-keys', nargs='*', metavar='KEY',
+                                 help="parse only these event attributes besides those the IC dimensions read; "
+                                      "the uncertainty IC then scores only the kept attributes")
+    argument_parser.add_argument('--seed', type=int, default=0)
+    argument_parser.add_argument('--lambda', dest='lambda_val', type=float, default=0.5)
+    argument_parser.add_argument('--sequence-threshold', type=float, default=0.2)
+    argument_parser.add_argument('--parallel-threshold-max', type=float, default=1.0)
+    argument_parser.add_argument('--choice-threshold', type=float, default=1.0)
+    argument_parser.add_argument('--discovery', choices=['iic', 'directly-follows'], default='iic',
+                                 help="infer relations from the IIC ranking or from directly-follows counts")
+    argument_parser.add_argument('--dependency-threshold', type=float, default=0.5)
+    argument_parser.add_argument('--min-frequency', type=float, default=0.0)
+    argument_parser.add_argument('--iic-weight', type=float, default=0.0,
+                                 help="weight of the IIC ranking in directly-follows discovery, from 0 to 1")
+    argument_parser.add_argument('--by-timestamp', action='store_true',
+                                 help="order events by timestamp when counting directly-follows pairs")
+    argument_parser.add_argument('--window', type=int, default=1, help="events paired by the temporal IC")
+    argument_parser.add_argument('--max-order', type=int, default=2, help="largest activity combination")
+    argument_parser.add_argument('--cache-dir', default='./.pipeline_cache')
+    argument_parser.add_argument('--no-cache', action='store_true')
+    argument_parser.add_argument('--render', default='images/petri_net1.pdf', help="output file of the rendered net; .pnml and .dot are written without pm4py")
+    argument_parser.add_argument('--no-render', action='store_true', help="skip rendering, e.g. in headless batch runs")
+    argument_parser.add_argument('--view', action='store_true', help="open the rendered net")
+    argument_parser.add_argument('--conformance', action='store_true',
+                                 help="replay the log on the net and print its fitness and precision")
+    argument_parser.add_argument('--workers', type=int, default=1, help="replay processes, 0 for one per CPU")
+    argument_parser.add_argument('--progress', action='store_true', help="print progress messages")
+    arguments = argument_parser.parse_args(argv)
+
+    metrics.configure(progress_interval=1.0 if arguments.progress else None)
+    pipeline = Pipeline(arguments.xes_dir_path, max_traces=arguments.max_traces,
+                        sample_size=None if arguments.all_traces else arguments.sample_size,
+                        stratify_by=None if arguments.stratify_by == 'none' else arguments.stratify_by,
+                        seed=arguments.seed, attribute_keys=arguments.attribute_keys, parse_workers=arguments.parse_workers or os.cpu_count(), lambda_val=arguments.lambda_val,
+                        sequence_threshold=arguments.sequence_threshold,
+                        parallel_threshold_max=arguments.parallel_threshold_max,
+                        choice_threshold=arguments.choice_threshold,
+                        discovery=arguments.discovery.replace('-', '_'),
+                        dependency_threshold=arguments.dependency_threshold,
+                        min_frequency=arguments.min_frequency, iic_weight=arguments.iic_weight,
+                        by_timestamp=arguments.by_timestamp,
+                        cache_dir=None if arguments.no_cache else arguments.cache_dir,
+                        window=arguments.window, max_order=arguments.max_order)
+    results = pipeline.run(None if arguments.no_render else arguments.render, arguments.view,
+                           arguments.conformance, arguments.workers or None)
+    print(results['inferred_relationships'])
+    if arguments.conformance:
+        conformance = results['conformance']
+        print(f"Fitness: {conformance['fitness']:.4f}  Precision: {conformance['precision']:.4f}  "
+              f"Fitting traces: {conformance['fitting_traces']:.2%}")
+    metrics.report()
+    return results
+
+
+if __name__ == '__main__':
+    main()
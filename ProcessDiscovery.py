@@ -0,0 +1,29 @@
+from Instrumentation import metrics
+
+
+@metrics.timed('relationship_inference')
+def infer_relationships(parsed_log, sequence_threshold=0.2, parallel_threshold_max=1.0, choice_threshold=1.0):
+    """Infer relationships between activities that are adjacent in the IIC ranking.
+
+    Args:
+        parsed_log (list): (activity, IIC) pairs sorted by decreasing IIC.
+        sequence_threshold (float): Largest IIC difference of a sequence relation.
+        parallel_threshold_max (float): Largest IIC difference of a parallel relation.
+        choice_threshold (float): IIC difference above which the relation is a choice.
+
+    Returns:
+        list: (activity, next activity, relation type) tuples.
+    """
+    inferred_relationships = []
+    for i in range(len(parsed_log) - 1):
+        activity, ic = parsed_log[i]
+        next_activity, next_ic = parsed_log[i + 1]
+        ic_diff = abs(next_ic - ic)
+
+        if ic_diff <= sequence_threshold:
+            inferred_relationships.append((activity, next_activity, 'sequence'))
+        elif sequence_threshold < ic_diff <= parallel_threshold_max:
+            inferred_relationships.append((activity, next_activity, 'parallel'))
+        elif ic_diff > choice_threshold:
+            inferred_relationships.append((activity, next_activity, 'choice'))
+    return inferred_relationships
@@ -0,0 +1,191 @@
+import hashlib
+import math
+
+import numpy as np
+
+
+def stable_hash(value):
+    """Return a 64-bit hash of a value that is stable across processes and runs."""
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), 'big')
+
+
+def information_error_bound(value, error):
+    """Largest change of -log2(value) when value is off by at most error (inf if it may reach 0)."""
+    if error <= 0:
+        return 0.0
+    if value <= error:
+        return math.inf
+    return math.log2(value / (value - error))
+
+
+class HyperLogLog:
+    """HyperLogLog estimator of the number of distinct values added to it.
+
+    Memory is fixed at 2**precision one-byte registers whatever the number of
+    values, and the relative standard error of the estimate is about
+    1.04 / sqrt(2**precision).
+
+    Attributes:
+        precision (int): Number of hash bits used to select a register.
+        registers (bytearray): Maximum rank seen by every register.
+    """
+
+    def __init__(self, precision=10):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        """Add a value to the estimator."""
+        hashed = stable_hash(value)
+        width = 64 - self.precision
+        index = hashed >> width
+        remainder = hashed & ((1 << width) - 1)
+        rank = width - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        """Return the estimated number of distinct values."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small cardinalities
+        return raw
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+    @property
+    def relative_error(self):
+        """Relative standard error of the estimate."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def merge(self, other):
+        """Fold another estimator of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLog estimators of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+
+class CountMinSketch:
+    """Count-Min sketch of the frequencies of hashable keys.
+
+    Estimates never undercount, and with probability 1 - delta they overcount by
+    at most epsilon * total, where epsilon = e / width and delta = exp(-depth).
+    Memory is fixed at depth * width counters.
+
+    Attributes:
+        width (int): Number of counters per row.
+        depth (int): Number of rows, each with its own hash function.
+        table (numpy.ndarray): depth x width int64 counters.
+        total (int): Sum of all counts added.
+    """
+
+    def __init__(self, width=2048, depth=5):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, key):
+        # Every row takes its own 64 bits of a BLAKE2b digest of the key (one 64-byte digest per
+        # 8 rows, salted by its index), so keys colliding in one row are independent in the others
+        data = repr(key).encode()
+        digest = b''.join(hashlib.blake2b(data, digest_size=64, salt=block.to_bytes(16, 'little')).digest()
+                          for block in range((self.depth + 7) // 8))
+        hashes = np.frombuffer(digest, dtype='<u8', count=self.depth)
+        return (hashes % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, key, count=1):
+        """Add count occurrences of key."""
+        self.table[np.arange(self.depth), self._columns(key)] += count
+        self.total += count
+
+    def estimate(self, key):
+        """Return the estimated number of occurrences of key."""
+        return int(self.table[np.arange(self.depth), self._columns(key)].min())
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def error_bound(self):
+        """Largest overcount of any estimate, with probability 1 - delta."""
+        return self.epsilon * self.total
+
+    def merge(self, other):
+        """Fold in another sketch of the same dimensions."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("cannot merge Count-Min sketches of different dimensions")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class HeavyHitters:
+    """Bounded set of the most frequent keys of a stream (Space-Saving style).
+
+    At most 2 * capacity keys are tracked. When that limit is exceeded only the
+    capacity keys with the largest counts are kept, and the smallest dropped count
+    becomes the starting error of keys seen afterwards, so every key whose true
+    count exceeds that error floor is retained.
+
+    Attributes:
+        capacity (int): Number of keys guaranteed to be kept.
+        counts (dict): Tracked key to [count, error].
+        floor (int): Largest count dropped so far.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.floor = 0
+
+    def add(self, key, count=1):
+        """Add count occurrences of key."""
+        entry = self.counts.get(key)
+        if entry is None:
+            self.counts[key] = [self.floor + count, self.floor]
+            if len(self.counts) > 2 * self.capacity:
+                self.prune()
+        else:
+            entry[0] += count
+
+    def prune(self):
+        ranked = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)
+        self.floor = max(self.floor, ranked[self.capacity][1][0])
+        self.counts = dict(ranked[:self.capacity])
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def merge(self, other):
+        """Fold in another tracker built over a different part of the stream."""
+        # A key untracked by one side may have occurred up to that side's floor times there
+        for key, entry in self.counts.items():
+            if key not in other.counts:
+                entry[0] += other.floor
+                entry[1] += other.floor
+        for key, (count, error) in other.counts.items():
+            entry = self.counts.get(key)
+            if entry is None:
+                self.counts[key] = [count + self.floor, error + self.floor]
+            else:
+                entry[0] += count
+                entry[1] += error
+        self.floor += other.floor
+        if len(self.counts) > 2 * self.capacity:
+            self.prune()
+        return self
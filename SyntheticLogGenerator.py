@@ -0,0 +1,108 @@
+import argparse
+import bisect
+import itertools
+import random
+from datetime import datetime, timedelta
+from xml.sax.saxutils import quoteattr
+
+from XESParser import COMPRESSED_OPENERS
+
+LIFECYCLE_TRANSITIONS = ['start', 'complete']
+ATTRIBUTE_TYPES = ['string', 'int', 'float', 'boolean']
+
+
+def generate_xes_log(path, n_traces=1000, trace_length=10, n_activities=20, n_attributes=2, n_variants=100,
+                     variant_skew=1.0, n_resources=10, seed=None):
+    """Write a synthetic XES event log with controlled size and shape.
+
+    Traces follow one of n_variants activity sequences, drawn from a Zipf
+    distribution with exponent variant_skew (0 gives uniformly frequent variants,
+    larger values concentrate the log on a few of them). Variant lengths are
+    spread around trace_length. Every event carries concept:name,
+    time:timestamp, org:resource, org:group and lifecycle:transition, plus
+    n_attributes extra attributes of rotating XES types. The log is written
+    trace by trace, so memory does not grow with n_traces, and compressed
+    according to the suffix of path (.xes.gz, .xes.bz2, .xes.xz).
+
+    Args:
+        path (str): Output file path.
+        n_traces (int): Number of traces.
+        trace_length (int): Mean number of events per trace.
+        n_activities (int): Size of the activity alphabet.
+        n_attributes (int): Number of extra event attributes.
+        n_variants (int): Number of distinct activity sequences.
+        variant_skew (float): Zipf exponent of the variant frequencies.
+        n_resources (int): Number of distinct org:resource values.
+        seed (int): Seed of the generator, for reproducible logs.
+
+    Returns:
+        dict: The generation parameters, with the number of events written.
+    """
+    rng = random.Random(seed)
+    activities = [f'Activity {index}' for index in range(n_activities)]
+    variants = []
+    for _ in range(n_variants):
+        length = max(1, round(rng.gauss(trace_length, trace_length / 4)))
+        variants.append([rng.choice(activities) for _ in range(length)])
+    cumulative = list(itertools.accumulate(1 / rank ** variant_skew for rank in range(1, n_variants + 1)))
+
+    opener = next((open_ for suffix, open_ in COMPRESSED_OPENERS.items() if path.endswith(suffix)), open)
+    start = datetime(2020, 1, 1)
+    n_events = 0
+    with opener(path, 'wt', encoding='utf-8') as output:
+        output.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<log xes.version="1.0" xmlns="http://www.xes-standard.org/">\n'
+                     '<extension name="Concept" prefix="concept" uri="http://www.xes-standard.org/concept.xesext"/>\n'
+                     '<extension name="Time" prefix="time" uri="http://www.xes-standard.org/time.xesext"/>\n'
+                     '<extension name="Lifecycle" prefix="lifecycle" uri="http://www.xes-standard.org/lifecycle.xesext"/>\n'
+                     '<extension name="Organizational" prefix="org" uri="http://www.xes-standard.org/org.xesext"/>\n'
+                     '<classifier name="Activity" keys="concept:name"/>\n'
+                     '<string key="concept:name" value="synthetic"/>\n')
+        for trace_id in range(n_traces):
+            variant = variants[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+            timestamp = start + timedelta(minutes=trace_id)
+            lines = [f'<trace><string key="concept:name" value="case {trace_id}"/>']
+            for activity in variant:
+                timestamp += timedelta(seconds=rng.randint(1, 3600))
+                resource = rng.randrange(n_resources)
+                lines.append(
+                    f'<event><string key="concept:name" value={quoteattr(activity)}/>'
+                    f'<date key="time:timestamp" value="{timestamp.isoformat()}.000+00:00"/>'
+                    f'<string key="org:resource" value="Resource {resource}"/>'
+                    f'<string key="org:group" value="Group {resource % 3}"/>'
+                    f'<string key="lifecycle:transition" value="{rng.choice(LIFECYCLE_TRANSITIONS)}"/>')
+                for index in range(n_attributes):
+                    kind = ATTRIBUTE_TYPES[index % len(ATTRIBUTE_TYPES)]
+                    if kind == 'string':
+                        value = f'value {rng.randrange(10)}'
+                    elif kind == 'int':
+                        value = rng.randrange(1000)
+                    elif kind == 'float':
+                        value = round(rng.uniform(0, 100), 2)
+                    else:
+                        value = rng.choice(['true', 'false'])
+                    lines.append(f'<{kind} key="attribute{index}" value="{value}"/>')
+                lines.append('</event>')
+            lines.append('</trace>\n')
+            output.write(''.join(lines))
+            n_events += len(variant)
+        output.write('</log>\n')
+    return {'path': path, 'n_traces': n_traces, 'trace_length': trace_length, 'n_activities': n_activities,
+            'n_attributes': n_attributes, 'n_variants': n_variants, 'variant_skew': variant_skew,
+            'n_resources': n_resources, 'seed': seed, 'n_events': n_events}
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description="Write a synthetic XES event log.")
+    argument_parser.add_argument('path', help="output file (.xes, .xes.gz, .xes.bz2 or .xes.xz)")
+    argument_parser.add_argument('--traces', type=int, default=1000)
+    argument_parser.add_argument('--trace-length', type=int, default=10)
+    argument_parser.add_argument('--activities', type=int, default=20)
+    argument_parser.add_argument('--attributes', type=int, default=2)
+    argument_parser.add_argument('--variants', type=int, default=100)
+    argument_parser.add_argument('--skew', type=float, default=1.0, help="Zipf exponent of the variant frequencies")
+    argument_parser.add_argument('--resources', type=int, default=10)
+    argument_parser.add_argument('--seed', type=int, default=None)
+    arguments = argument_parser.parse_args()
+    print(generate_xes_log(arguments.path, arguments.traces, arguments.trace_length, arguments.activities,
+                           arguments.attributes, arguments.variants, arguments.skew, arguments.resources, arguments.seed))
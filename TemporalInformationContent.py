@@ -1,35 +1,127 @@
+import math
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from ColumnarEventLog import MISSING_TIMESTAMP, ColumnarEventLog, encode_timestamp
+from Instrumentation import metrics
+from VariantIndex import VariantIndex
+
+
 class TemporalInformationContentCalculator:
-    def __init__(self):
+    def __init__(self, window=1, time_scale=60):
+        # window: number of following events paired with each event (1 = directly-follows pairs)
+        # time_scale: decay constant of the adjustment factor, in seconds
+        self.window = window
+        self.time_scale = time_scale
         self.TemporalRelations = {}
+        self.TemporalRelationStatistics = {}
+        self.ActivityRelations = defaultdict(dict)  # activity -> {event pair: time interval} for the pairs it is part of
         self.EventProbabilities = {}
     
-    def calculate_temporal_information_content(self, traces, lambda_val):
+    @metrics.timed('temporal_ic')
+    def calculate_temporal_information_content(self, traces, lambda_val, variants=None):
+        # variants: optional VariantIndex of the same traces, used for the sequence-only statistics
+        if isinstance(traces, ColumnarEventLog):
+            return self.calculate_temporal_information_content_columnar(traces, lambda_val)
         IC_Temporal = {}
-        # Assuming extract_temporal_relations and estimate_event_probabilities are revised to handle dictionaries
         self.extract_temporal_relations(traces)
-        self.estimate_event_probabilities(traces)
-        for trace in traces:
-            for event in trace:
-                # Assuming 'concept:name' as the unique identifier for each event
-                event_id = event['concept:name']
-                P_a = self.get_event_probability(event_id)
-                TemporalContext = self.get_temporal_context(event_id)
-                AdjustedProbability = self.adjust_probability_for_temporal_context(P_a, TemporalContext)
-                if AdjustedProbability > 0:
-                    IC_Temporal[event_id] = -lambda_val * math.log2(AdjustedProbability)
-                else:
-                    IC_Temporal[event_id] = float('inf')
+        self.estimate_event_probabilities(traces if variants is None else variants)
+        if variants is not None:
+            # The IC only depends on the activity: visit each activity once, in order of first appearance
+            activities = variants.activity_counts()
+        else:
+            # Assuming 'concept:name' as the unique identifier for each event
+            activities = (event['concept:name'] for trace in traces for event in trace)
+        for event_id in activities:
+            if event_id not in IC_Temporal:
+                IC_Temporal[event_id] = self.calculate_event_information_content(event_id, lambda_val)
         return IC_Temporal
 
+    def calculate_temporal_information_content_columnar(self, log, lambda_val):
+        # Vectorized path: the IC only depends on the activity, so it is computed once per activity
+        self.extract_temporal_relations(log)
+        counts = log.activity_counts()
+        total_events = log.n_events
+        IC_Temporal = {}
+        for activity_id in log.activities_in_order().tolist():
+            event_id = log.activities[activity_id]
+            self.EventProbabilities[event_id] = int(counts[activity_id]) / total_events
+            IC_Temporal[event_id] = self.calculate_event_information_content(event_id, lambda_val)
+        return IC_Temporal
+
+    def calculate_event_information_content(self, event_id, lambda_val):
+        # Computed in log space, as the product of adjustment factors underflows for long intervals
+        P_a = self.get_event_probability(event_id)
+        if P_a <= 0:
+            return float('inf')
+        TemporalContext = self.get_temporal_context(event_id)
+        log_adjusted_probability = math.log2(P_a)
+        for event_pair, time_interval in TemporalContext.items():
+            log_adjusted_probability += self.calculate_log_adjustment_factor(time_interval)
+        return -lambda_val * log_adjusted_probability
+
+    def extract_temporal_relations(self, traces, window=None):
+        # Pairs every event with the next `window` events of its trace and aggregates the
+        # intervals (in seconds) per activity pair with vectorized timestamp differences.
+        # An event recorded before the one preceding it in the trace (out-of-order timestamps)
+        # gives an interval of 0: a negative interval would turn the decay factor into a growth
+        # factor and raise the IC above that of simultaneous events.
+        log = traces if isinstance(traces, ColumnarEventLog) else ColumnarEventLog.from_traces(traces)
+        window = self.window if window is None else window
+        activity_ids = log.activity_ids.astype(np.int64)
+        timestamps = log.timestamps
+        trace_index = log.trace_index()
+
+        sources, targets, intervals = [], [], []
+        for distance in range(1, window + 1):
+            valid = trace_index[distance:] == trace_index[:-distance]
+            valid &= (timestamps[distance:] != MISSING_TIMESTAMP) & (timestamps[:-distance] != MISSING_TIMESTAMP)
+            sources.append(activity_ids[:-distance][valid])
+            targets.append(activity_ids[distance:][valid])
+            intervals.append(np.maximum(timestamps[distance:][valid] - timestamps[:-distance][valid], 0) / 1e6)
+
+        self.TemporalRelations = {}
+        self.TemporalRelationStatistics = {}
+        self.ActivityRelations = defaultdict(dict)
+        if not sources or not sum(len(source) for source in sources):
+            return self.TemporalRelations
+
+        n_activities = len(log.activities)
+        pairs = np.concatenate(sources) * n_activities + np.concatenate(targets)
+        intervals = np.concatenate(intervals)
+        unique_pairs, inverse, counts = np.unique(pairs, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        means = np.bincount(inverse, weights=intervals) / counts
+        variances = np.maximum(np.bincount(inverse, weights=intervals ** 2) / counts - means ** 2, 0)
+        minimums = np.full(len(unique_pairs), np.inf)
+        maximums = np.full(len(unique_pairs), -np.inf)
+        np.minimum.at(minimums, inverse, intervals)
+        np.maximum.at(maximums, inverse, intervals)
+
+        for pair, count, mean, variance, minimum, maximum in zip(
+                unique_pairs.tolist(), counts.tolist(), means.tolist(), variances.tolist(),
+                minimums.tolist(), maximums.tolist()):
+            event_pair = (log.activities[pair // n_activities], log.activities[pair % n_activities])
+            self.add_temporal_relation(event_pair, count, mean, math.sqrt(variance), minimum, maximum)
+        return self.TemporalRelations
 
-    def extract_temporal_relations(self, event):
-        TemporalContext = {}
-        for event_pair, time_interval in self.TemporalRelations.items():
-            if event in event_pair:
-                TemporalContext[event_pair] = time_interval
-        return TemporalContext
+    def add_temporal_relation(self, event_pair, count, mean, std, minimum, maximum):
+        # Registers the aggregated intervals (in seconds) of one activity pair
+        self.TemporalRelations[event_pair] = mean
+        self.TemporalRelationStatistics[event_pair] = {
+            'count': count, 'mean': mean, 'std': std, 'min': minimum, 'max': maximum,
+        }
+        for event in set(event_pair):
+            self.ActivityRelations[event][event_pair] = mean
     
     def estimate_event_probabilities(self, traces):
+        if isinstance(traces, VariantIndex):
+            event_frequencies = traces.activity_counts()
+            total_events = sum(event_frequencies.values())
+            for event_id, frequency in event_frequencies.items():
+                self.EventProbabilities[event_id] = frequency / total_events
+            return
         event_frequencies = {}
         total_events = sum(len(trace) for trace in traces)
 
@@ -56,11 +148,8 @@ class TemporalInformationContentCalculator:
             return 0
 
     def get_temporal_context(self, event):
-        TemporalContext = {}
-        for event_pair, time_interval in self.TemporalRelations.items():
-            if event in event_pair:
-                TemporalContext[event_pair] = time_interval
-        return TemporalContext
+        # Indexed lookup: only the relations the activity takes part in are visited
+        return dict(self.ActivityRelations.get(event, {}))
 
     def adjust_probability_for_temporal_context(self, P_a, TemporalContext):
         AdjustedProbability = P_a
@@ -85,4 +174,102 @@ class TemporalInformationContentCalculator:
 
     def calculate_adjustment_factor(self, time_interval):
         # Example implementation: calculate the adjustment factor based on the time interval
-        return math.exp(-time_interval / 60)  # Adjusted factor using an exponential decay function
+        return math.exp(-time_interval / self.time_scale)  # Adjusted factor using an exponential decay function
+
+    def calculate_log_adjustment_factor(self, time_interval):
+        # log2 of calculate_adjustment_factor, without the underflow of exp for long intervals
+        return -time_interval / self.time_scale / math.log(2)
+
+    def create_partial(self):
+        # Empty mergeable statistics matching this calculator's settings
+        return TemporalPartial(self.window)
+
+    def load_partial(self, partial):
+        # Replaces the calculator's statistics with those of a (merged) TemporalPartial
+        total_events = sum(partial.activity_counts.values())
+        self.EventProbabilities = {event_id: count / total_events for event_id, count in partial.activity_counts.items()}
+        self.TemporalRelations = {}
+        self.TemporalRelationStatistics = {}
+        self.ActivityRelations = defaultdict(dict)
+        for event_pair, (count, total, squares, minimum, maximum) in partial.interval_statistics.items():
+            mean = total / count
+            variance = max(squares / count - mean * mean, 0)
+            self.add_temporal_relation(event_pair, count, mean / 1e6, math.sqrt(variance) / 1e6, minimum / 1e6, maximum / 1e6)
+
+    @metrics.timed('temporal_ic')
+    def calculate_from_partial(self, partial, lambda_val):
+        self.load_partial(partial)
+        return {event_id: self.calculate_event_information_content(event_id, lambda_val)
+                for event_id in partial.activity_counts}
+
+
+class TemporalPartial:
+    """Mergeable statistics of the temporal IC over a slice of the traces.
+
+    Holds the activity counts and, per activity pair, [count, sum, sum of squares,
+    min, max] of the intervals in integer microseconds, so that merging is exact.
+    merge is associative; merging slices in trace order keeps activities in order
+    of first appearance. Instances are plain data and can be pickled.
+    """
+
+    def __init__(self, window=1):
+        self.window = window
+        self.activity_counts = Counter()
+        self.interval_statistics = {}
+
+    def update(self, trace):
+        activities = [event['concept:name'] for event in trace]
+        self.activity_counts.update(activities)
+        for activity, follower, interval in self.intervals(trace, activities):
+            statistics = self.interval_statistics.get((activity, follower))
+            if statistics is None:
+                self.interval_statistics[(activity, follower)] = [1, interval, interval * interval, interval, interval]
+            else:
+                statistics[0] += 1
+                statistics[1] += interval
+                statistics[2] += interval * interval
+                statistics[3] = min(statistics[3], interval)
+                statistics[4] = max(statistics[4], interval)
+        return self
+
+    def remove(self, trace):
+        # Inverse of update; min and max remain bounds over every trace ever added
+        activities = [event['concept:name'] for event in trace]
+        self.activity_counts.subtract(activities)
+        for activity in set(activities):
+            if self.activity_counts[activity] <= 0:
+                del self.activity_counts[activity]
+        for activity, follower, interval in self.intervals(trace, activities):
+            statistics = self.interval_statistics[(activity, follower)]
+            statistics[0] -= 1
+            statistics[1] -= interval
+            statistics[2] -= interval * interval
+            if statistics[0] == 0:
+                del self.interval_statistics[(activity, follower)]
+        return self
+
+    def intervals(self, trace, activities):
+        # (activity, following activity, interval in microseconds) for the events within the window,
+        # clamped at 0 for out-of-order timestamps as in extract_temporal_relations
+        timestamps = [encode_timestamp(event.get('time:timestamp')) for event in trace]
+        for position, start in enumerate(timestamps):
+            if start == MISSING_TIMESTAMP:
+                continue
+            for follower in range(position + 1, min(position + self.window + 1, len(timestamps))):
+                end = timestamps[follower]
+                if end != MISSING_TIMESTAMP:
+                    yield activities[position], activities[follower], max(end - start, 0)
+
+    def merge(self, other):
+        self.activity_counts.update(other.activity_counts)
+        for event_pair, (count, total, squares, minimum, maximum) in other.interval_statistics.items():
+            statistics = self.interval_statistics.get(event_pair)
+            if statistics is None:
+                self.interval_statistics[event_pair] = [count, total, squares, minimum, maximum]
+            else:
+                statistics[0] += count
+                statistics[1] += total
+                statistics[2] += squares
+                statistics[3] = min(statistics[3], minimum)
+                statistics[4] = max(statistics[4], maximum)
+        return self
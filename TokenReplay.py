@@ -0,0 +1,297 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from Instrumentation import metrics
+from VariantIndex import VariantIndex
+
+
+SILENT_DEPTH = 4
+
+
+class TokenReplayer:
+    """Token-based replay of trace variants on a PetriNetModel.PetriNet.
+
+    Every event fires a transition carrying its activity as label: an enabled one
+    if there is one, otherwise the one missing the fewest tokens, whose missing
+    tokens are added to the marking and counted. When the net has a transition
+    labelled end_label (the "End" transition of build_native_petri_net), it is
+    fired after the last event, as the completion of the trace. The final
+    marking is then consumed; tokens missing from it are counted as missing and
+    the tokens left elsewhere as remaining. An event whose activity labels no
+    transition counts as one missing and one consumed token.
+
+    Silent transitions (labelled None) are fired only to enable the transition of
+    an event: a missing input token is first sought by firing, on a copy of the
+    marking, a chain of at most SILENT_DEPTH silent transitions that produces it.
+    The labels enabled in a marking include those reachable through silent
+    transitions, found by propagating marked places through them (ignoring
+    competition for tokens).
+
+    Replay is deterministic, so results are cached per variant, and the prefixes
+    shared by variants reach the same markings; precision compares the labels
+    enabled after each prefix with the activities that follow it in the log.
+
+    Attributes:
+        net (PetriNet): The net being replayed.
+        initial_marking (dict): Place to tokens.
+        final_marking (dict): Place to tokens.
+        end_label (str): Label of the transition fired at the end of every trace, or None.
+        cache (dict): Activity sequence (tuple) to its replay result.
+    """
+
+    def __init__(self, net, initial_marking, final_marking, end_label="End"):
+        self.net = net
+        self.initial_marking = initial_marking
+        self.final_marking = final_marking
+        self.cache = {}
+        self.inputs = [[place.index for place in places] for places in net.transition_inputs]
+        self.outputs = [[place.index for place in places] for places in net.transition_outputs]
+        self.place_outputs = [[transition.index for transition in transitions] for transitions in net.place_outputs]
+        self.labels = [transition.label for transition in net.transitions]
+        self.by_label = {label: [transition.index for transition in transitions]
+                         for label, transitions in net.transitions_by_label().items() if label is not None}
+        self.silent = [transition.index for transition in net.transitions if transition.label is None]
+        self.producers = [[transition.index for transition in transitions if transition.label is None]
+                          for transitions in net.place_inputs]
+        self.end_label = end_label if end_label in self.by_label else None
+        self.initial = {place.index: tokens for place, tokens in initial_marking.items()}
+        self.final = {place.index: tokens for place, tokens in final_marking.items()}
+
+    def __getstate__(self):
+        # Worker processes rebuild the indexes from the net and markings, without the cache
+        return {'net': self.net, 'initial_marking': self.initial_marking, 'final_marking': self.final_marking,
+                'end_label': self.end_label}
+
+    def __setstate__(self, state):
+        self.__init__(state['net'], state['initial_marking'], state['final_marking'], state['end_label'])
+
+    # Markings hold only the places with tokens
+    def missing_tokens(self, marking, transition):
+        return sum(1 for place in self.inputs[transition] if place not in marking)
+
+    def enabled_labels(self, marking):
+        """Return the labels of the transitions enabled in a marking, directly or through silent transitions."""
+        reachable = set(marking)
+        if self.silent:
+            changed = True
+            while changed:
+                changed = False
+                for transition in self.silent:
+                    if all(place in reachable for place in self.inputs[transition]):
+                        for place in self.outputs[transition]:
+                            if place not in reachable:
+                                reachable.add(place)
+                                changed = True
+        candidates = {transition for place in reachable for transition in self.place_outputs[place]}
+        return frozenset(self.labels[transition] for transition in candidates
+                         if self.labels[transition] is not None
+                         and all(place in reachable for place in self.inputs[transition]))
+
+    def consume_produce(self, marking, transition):
+        """Fire a transition in marking, creating its missing input tokens; return the number missing."""
+        missing = 0
+        for place in self.inputs[transition]:
+            tokens = marking.get(place)
+            if tokens is None:
+                missing += 1
+            elif tokens == 1:
+                del marking[place]
+            else:
+                marking[place] = tokens - 1
+        for place in self.outputs[transition]:
+            marking[place] = marking.get(place, 0) + 1
+        return missing
+
+    def produce_silently(self, marking, place, depth, fired):
+        """Try to put a token in place by firing silent transitions, updating marking and the
+        [produced, consumed] counts in fired only on success."""
+        for transition in self.producers[place]:
+            trial = dict(marking)
+            trial_fired = [0, 0]
+            if all(input_place in trial or (depth > 1 and self.produce_silently(trial, input_place, depth - 1, trial_fired))
+                   for input_place in self.inputs[transition]) \
+                    and all(input_place in trial for input_place in self.inputs[transition]):
+                self.consume_produce(trial, transition)
+                marking.clear()
+                marking.update(trial)
+                fired[0] += trial_fired[0] + len(self.outputs[transition])
+                fired[1] += trial_fired[1] + len(self.inputs[transition])
+                return True
+        return False
+
+    def enable_silently(self, marking, transition):
+        """Enable a transition by firing silent transitions; return the [produced, consumed] tokens
+        of the silent firings, or None, leaving marking unchanged, if it cannot be enabled."""
+        trial = dict(marking)
+        fired = [0, 0]
+        for place in self.inputs[transition]:
+            if place not in trial and not self.produce_silently(trial, place, SILENT_DEPTH, fired):
+                return None
+        if not all(place in trial for place in self.inputs[transition]):
+            return None
+        marking.clear()
+        marking.update(trial)
+        return fired
+
+    def fire(self, marking, activity):
+        """Fire the transition replaying one activity, updating marking in place.
+
+        Returns:
+            tuple: (produced, consumed, missing) tokens.
+        """
+        transitions = self.by_label.get(activity)
+        if not transitions:
+            return 0, 1, 1
+        ranked = sorted(transitions, key=lambda candidate: (self.missing_tokens(marking, candidate), candidate))
+        transition = ranked[0]
+        produced = consumed = 0
+        if self.silent and self.missing_tokens(marking, transition):
+            for candidate in ranked:
+                fired = self.enable_silently(marking, candidate)
+                if fired is not None:
+                    transition = candidate
+                    produced, consumed = fired
+                    break
+        missing = self.consume_produce(marking, transition)
+        return produced + len(self.outputs[transition]), consumed + len(self.inputs[transition]), missing
+
+    def complete(self, state, enabled):
+        """Finish the replay of a trace from the state reached after its last event."""
+        marking, produced, consumed, missing = state
+        marking = dict(marking)
+        if self.end_label is not None:
+            fired = self.fire(marking, self.end_label)
+            produced, consumed, missing = produced + fired[0], consumed + fired[1], missing + fired[2]
+        for place, tokens in self.final.items():
+            available = marking.pop(place, 0)
+            missing += max(tokens - available, 0)
+            consumed += tokens
+            if available > tokens:
+                marking[place] = available - tokens
+        remaining = sum(marking.values())
+        return {'produced': produced, 'consumed': consumed, 'missing': missing, 'remaining': remaining,
+                'enabled': list(enabled)}
+
+    def replay_sorted(self, sequences):
+        """Replay sequences in sorted order, each resuming from the state after the longest prefix it
+        shares with the previous one, and return (sequence, result) pairs."""
+        initial = {place: tokens for place, tokens in self.initial.items() if tokens > 0}
+        states = [(initial, sum(initial.values()), 0, 0)]
+        enabled = [self.enabled_labels(initial)]
+        previous = ()
+        replayed = []
+        for sequence in sorted(sequences):
+            shared = 0
+            for activity, previous_activity in zip(sequence, previous):
+                if activity != previous_activity:
+                    break
+                shared += 1
+            del states[shared + 1:], enabled[shared + 1:]
+            for activity in sequence[shared:]:
+                marking, produced, consumed, missing = states[-1]
+                marking = dict(marking)
+                fired = self.fire(marking, activity)
+                states.append((marking, produced + fired[0], consumed + fired[1], missing + fired[2]))
+                enabled.append(self.enabled_labels(marking))
+            replayed.append((sequence, self.complete(states[-1], enabled)))
+            previous = sequence
+        return replayed
+
+    def replay_variant(self, sequence):
+        """Replay one activity sequence, returning a dict with the produced, consumed, missing and
+        remaining tokens, and enabled: the labels enabled after each prefix (len(sequence) + 1 sets)."""
+        return self.replay_variants([sequence])[0]
+
+    def replay_variants(self, sequences, workers=1):
+        """Replay the sequences not cached yet, over a process pool of `workers` processes unless it is 1
+        (None uses every CPU), and return the results of all sequences in order."""
+        sequences = [tuple(sequence) for sequence in sequences]
+        distinct = list(dict.fromkeys(sequences))
+        pending = sorted(sequence for sequence in distinct if sequence not in self.cache)
+        metrics.count('replay_cache_hits', len(distinct) - len(pending))
+        if workers != 1 and len(pending) > 1:
+            # Contiguous slices of the sorted variants, so that each worker still shares prefixes
+            n_chunks = min(len(pending), 4 * (workers or os.cpu_count() or 1))
+            size = -(-len(pending) // n_chunks)
+            chunks = [pending[start:start + size] for start in range(0, len(pending), size)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for replayed in executor.map(_replay_chunk, [self] * len(chunks), chunks):
+                    self.cache.update(replayed)
+        elif pending:
+            self.cache.update(self.replay_sorted(pending))
+        metrics.count('variants_replayed', len(pending))
+        return [self.cache[sequence] for sequence in sequences]
+
+    @metrics.timed('replay')
+    def replay(self, log, workers=1):
+        """Replay an event log and score the net against it.
+
+        Args:
+            log: VariantIndex, or traces of event dictionaries (indexed first).
+            workers (int): Number of replay processes; 1 replays in this process.
+
+        Returns:
+            dict: fitness (token-based log fitness), precision (escaping-labels precision),
+                fitting_traces (share of traces replayed without missing or remaining tokens),
+                average_trace_fitness, the produced, consumed, missing and remaining token totals,
+                n_traces and n_variants.
+        """
+        variants = log if isinstance(log, VariantIndex) else VariantIndex.from_traces(log)
+        sequences, counts = [], []
+        for sequence, count in variants:
+            sequences.append(sequence)
+            counts.append(count)
+        results = self.replay_variants(sequences, workers)
+
+        totals = dict.fromkeys(('produced', 'consumed', 'missing', 'remaining'), 0)
+        fitting = trace_fitness = 0
+        for result, count in zip(results, counts):
+            for key in totals:
+                totals[key] += result[key] * count
+            if result['missing'] == 0 and result['remaining'] == 0:
+                fitting += count
+            trace_fitness += token_fitness(result) * count
+        n_traces = sum(counts)
+        return dict(totals, fitness=token_fitness(totals), precision=self.precision(sequences, counts, results),
+                    fitting_traces=fitting / n_traces if n_traces else 1.0,
+                    average_trace_fitness=trace_fitness / n_traces if n_traces else 1.0,
+                    n_traces=n_traces, n_variants=len(sequences))
+
+    def precision(self, sequences, counts, results):
+        """Escaping-labels precision: 1 - escaping / enabled labels, over the prefixes of the log weighted by
+        the number of traces sharing them; the end of a trace is followed by end_label."""
+        children = {}
+        weights, continuations, enabled = [0], [set()], [frozenset()]
+        for sequence, count, result in zip(sequences, counts, results):
+            node = 0
+            for step, labels in enumerate(result['enabled']):
+                weights[node] += count
+                enabled[node] = labels
+                following = sequence[step] if step < len(sequence) else self.end_label
+                if following is None:
+                    break
+                continuations[node].add(following)
+                child = children.get((node, following))
+                if child is None:
+                    child = children[node, following] = len(weights)
+                    weights.append(0)
+                    continuations.append(set())
+                    enabled.append(frozenset())
+                node = child
+        escaping = allowed = 0
+        for weight, observed, labels in zip(weights, continuations, enabled):
+            escaping += weight * len(labels - observed)
+            allowed += weight * len(labels)
+        return 1.0 - escaping / allowed if allowed else 1.0
+
+
+def token_fitness(counts):
+    """Token-based fitness 1/2 (1 - missing / consumed) + 1/2 (1 - remaining / produced)."""
+    missing_ratio = counts['missing'] / counts['consumed'] if counts['consumed'] else 0.0
+    remaining_ratio = counts['remaining'] / counts['produced'] if counts['produced'] else 0.0
+    return 0.5 * (1 - missing_ratio) + 0.5 * (1 - remaining_ratio)
+
+
+def _replay_chunk(replayer, sequences):
+    """Replay a chunk of sorted variants in a worker process."""
+    return replayer.replay_sorted(sequences)
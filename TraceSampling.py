@@ -0,0 +1,183 @@
+import heapq
+import math
+import random
+
+
+class TraceSampler:
+    """Single-pass, fixed-size sampler of the traces of an event log.
+
+    Every trace draws a uniform random priority. Within each stratum the sampler
+    keeps the traces whose priority is below a threshold that only decreases, so
+    the traces kept for a stratum are always a uniform random sample of it,
+    whatever the order of the input. Without strata this is reservoir sampling
+    over the whole log. With strata (trace variant, source file or any key), each
+    stratum is given a share of the sample proportional to its number of traces.
+    Fractional shares are rounded up or down at random (systematic rounding from
+    one uniform offset), so that every trace is sampled with the same probability
+    sample_size / n_traces and the sample is self-weighting: statistics computed on
+    it estimate those of the whole log.
+
+    Shares are only known at the end of the stream, so no stratum drops a trace
+    whose priority is among the 2 * sample_size smallest of the whole log (a
+    global threshold), nor one among the current share's worth of its own
+    smallest. A stratum that grows late, such as a file read last, thus keeps
+    about twice its final share rather than the smaller share it had partway
+    through. In the rare case a stratum still falls short, its missing traces go
+    to the strata furthest below their quotas, so the sample keeps its size.
+
+    With coverage=True every stratum instead gets at least one trace while there
+    are fewer strata than sample_size, so rare variants and small files are not
+    lost. The sample then over-represents small strata; it suits inspection, not
+    estimation, unless its traces are weighted by weights().
+
+    While streaming, at most four times sample_size traces plus one per stratum
+    are held in memory.
+
+    Attributes:
+        sample_size (int): Number of traces in the final sample.
+        stratify_by (str or callable): None, 'variant', 'file', or a function of
+            (trace, source) returning the stratum key.
+        n_traces (int): Number of traces seen.
+        coverage (bool): Whether every stratum gets at least one trace.
+        stratum_sizes (dict): Stratum key to number of traces seen, in order of first appearance.
+    """
+
+    def __init__(self, sample_size, stratify_by=None, seed=None, coverage=False):
+        if sample_size < 1:
+            raise ValueError("sample_size must be at least 1")
+        if stratify_by not in (None, 'variant', 'file') and not callable(stratify_by):
+            raise ValueError("stratify_by must be None, 'variant', 'file' or a callable")
+        self.sample_size = sample_size
+        self.stratify_by = stratify_by
+        self.coverage = coverage
+        self.random = random.Random(seed)
+        self.rounding_offset = self.random.random()
+        self.n_traces = 0
+        self.stratum_sizes = {}
+        self.reservoirs = {}  # stratum key -> max-heap of (-priority, arrival, trace)
+        self.thresholds = {}  # stratum key -> priority below which traces are kept
+        self.smallest = []  # max-heap of the negated 2 * sample_size smallest priorities seen
+        self.retained = 0
+
+    def stratum_key(self, trace, source=None):
+        if self.stratify_by is None:
+            return None
+        if self.stratify_by == 'variant':
+            return tuple(event['concept:name'] for event in trace)
+        if self.stratify_by == 'file':
+            return source
+        return self.stratify_by(trace, source)
+
+    def capacity(self, key):
+        """Current share of the sample of a stratum, proportional to its size."""
+        return max(1, math.ceil(self.sample_size * self.stratum_sizes[key] / self.n_traces))
+
+    @property
+    def global_threshold(self):
+        """Priority below which no stratum drops a trace."""
+        return -self.smallest[0] if len(self.smallest) == 2 * self.sample_size else 1.0
+
+    def add(self, trace, source=None):
+        """Offer one trace to the sample; source names the file it came from."""
+        key = self.stratum_key(trace, source)
+        self.n_traces += 1
+        self.stratum_sizes[key] = self.stratum_sizes.get(key, 0) + 1
+        if key not in self.reservoirs:
+            self.reservoirs[key] = []
+            self.thresholds[key] = 1.0
+        priority = self.random.random()
+        if priority < self.global_threshold:
+            if len(self.smallest) == 2 * self.sample_size:
+                heapq.heapreplace(self.smallest, -priority)
+            else:
+                heapq.heappush(self.smallest, -priority)
+        if priority < self.thresholds[key]:
+            heapq.heappush(self.reservoirs[key], (-priority, self.n_traces, trace))
+            self.retained += 1
+            self.shrink(key, self.capacity(key))
+        if self.retained > 4 * self.sample_size + len(self.reservoirs):
+            for stratum in self.reservoirs:
+                self.shrink(stratum, self.capacity(stratum))
+
+    def add_traces(self, traces, source=None):
+        """Offer every trace of an iterable."""
+        for trace in traces:
+            self.add(trace, source)
+        return self
+
+    def shrink(self, key, size):
+        # Dropping the highest priorities lowers the threshold, keeping the reservoir uniform;
+        # traces below the global threshold are kept whatever the size
+        reservoir = self.reservoirs[key]
+        global_threshold = self.global_threshold
+        while len(reservoir) > size and -reservoir[0][0] >= global_threshold:
+            negative_priority, _, _ = heapq.heappop(reservoir)
+            self.thresholds[key] = min(self.thresholds[key], -negative_priority)
+            self.retained -= 1
+
+    def allocation(self):
+        """Number of sampled traces of every stratum, summing to at most sample_size."""
+        available = {key: len(reservoir) for key, reservoir in self.reservoirs.items()}
+        if self.coverage:
+            return self.coverage_allocation(available)
+        if self.n_traces <= self.sample_size:
+            return available
+        # Stratum quotas laid end to end on [0, sample_size): a stratum gets the number of points
+        # rounding_offset + j in its interval, the floor or ceiling of its quota with the quota as mean
+        shares = {}
+        quotas = {}
+        cumulative = 0.0
+        for key in available:
+            start = cumulative
+            quotas[key] = self.sample_size * self.stratum_sizes[key] / self.n_traces
+            cumulative += quotas[key]
+            points = math.ceil(cumulative - self.rounding_offset) - math.ceil(start - self.rounding_offset)
+            shares[key] = max(0, min(available[key], points))
+        # A stratum short of traces hands its slots to those furthest below their quota
+        candidates = [(shares[key] - quotas[key], position, key)
+                      for position, key in enumerate(available) if shares[key] < available[key]]
+        heapq.heapify(candidates)
+        remaining = self.sample_size - sum(shares.values())
+        while remaining > 0 and candidates:
+            _, position, key = heapq.heappop(candidates)
+            shares[key] += 1
+            remaining -= 1
+            if shares[key] < available[key]:
+                heapq.heappush(candidates, (shares[key] - quotas[key], position, key))
+        return shares
+
+    def coverage_allocation(self, available):
+        """Allocation of coverage mode: one trace per stratum first, then proportional to the stratum sizes."""
+        minimum = 1 if len(available) <= self.sample_size else 0
+        shares = {key: min(available[key], minimum) for key in available}
+        # Remaining slots go one at a time to the stratum with the largest size per allocated trace
+        candidates = [(-self.stratum_sizes[key] / (shares[key] + 1), position, key)
+                      for position, key in enumerate(available) if shares[key] < available[key]]
+        heapq.heapify(candidates)
+        remaining = min(self.sample_size, sum(available.values())) - sum(shares.values())
+        while remaining > 0 and candidates:
+            _, position, key = heapq.heappop(candidates)
+            shares[key] += 1
+            remaining -= 1
+            if shares[key] < available[key]:
+                heapq.heappush(candidates, (-self.stratum_sizes[key] / (shares[key] + 1), position, key))
+        return shares
+
+    def stratum_samples(self):
+        """Return stratum key to (number of traces seen, sampled traces in arrival order)."""
+        samples = {}
+        for key, size in self.allocation().items():
+            kept = heapq.nsmallest(size, self.reservoirs[key], key=lambda entry: -entry[0])
+            samples[key] = (self.stratum_sizes[key], [trace for _, _, trace in sorted(kept, key=lambda entry: entry[1])])
+        return samples
+
+    def sample(self):
+        """Return the sampled traces, in arrival order."""
+        kept = []
+        for key, size in self.allocation().items():
+            kept.extend(heapq.nsmallest(size, self.reservoirs[key], key=lambda entry: -entry[0]))
+        return [trace for _, _, trace in sorted(kept, key=lambda entry: entry[1])]
+
+    def weights(self):
+        """Return stratum key to the number of log traces each of its sampled traces stands for."""
+        return {key: self.stratum_sizes[key] / size for key, size in self.allocation().items() if size}
@@ -1,58 +1,244 @@
+import math
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from ColumnarEventLog import MISSING_TIMESTAMP, ColumnarEventLog
+from Instrumentation import metrics
+from Sketches import HyperLogLog, information_error_bound
+
+
 class UncertaintyICCalculator:
-    def __init__(self, event_log):
+    def __init__(self, event_log, variants=None, cardinality_precision=None):
+        # variants: optional VariantIndex of the same log, used to estimate the event probabilities
+        # cardinality_precision: if set, distinct attribute values are counted with a HyperLogLog of
+        # that precision per (activity, attribute) instead of an exact set, bounding memory
         self.event_log = event_log
+        self.variants = variants
+        self.cardinality_precision = cardinality_precision
         self.expected_attributes = ['concept:name', 'time:timestamp', 'resource']  # Example expected attributes
         self.IC_Uncertainty = {}
-        self.event_probabilities = self.estimate_event_probabilities()
-        self.uncertainty_factors = self.quantify_uncertainty_factors()
+        # Standard error of the uncertainty factor of every activity, non-zero only for HyperLogLog
+        # counts, and the resulting bound on every IC value (two standard errors, about 95%)
+        self.uncertainty_errors = {}
+        self.IC_error_bounds = {}
+        if event_log is None:
+            # Statistics are filled in by the caller (e.g. FusedICEngine)
+            self.event_probabilities = {}
+            self.uncertainty_factors = {}
+        elif isinstance(event_log, ColumnarEventLog):
+            with metrics.stage('uncertainty_ic'):
+                self.event_probabilities = self.estimate_event_probabilities_columnar()
+                self.uncertainty_factors = self.quantify_uncertainty_factors_columnar()
+        else:
+            with metrics.stage('uncertainty_ic'):
+                self.event_probabilities = self.estimate_event_probabilities()
+                self.uncertainty_factors = self.quantify_uncertainty_factors()
+
+    def estimate_event_probabilities_columnar(self):
+        log = self.event_log
+        counts = log.activity_counts()
+        return {log.activities[a]: int(counts[a]) / log.n_events for a in log.activities_in_order().tolist()}
+
+    def quantify_uncertainty_factors_columnar(self):
+        # Vectorized path: every attribute column is reduced per activity with bincount,
+        # and distinct values per activity are counted on (activity, code) pairs
+        log = self.event_log
+        n_activities = len(log.activities)
+        activity_ids = log.activity_ids
+        missing_data = np.zeros(n_activities, dtype=np.int64)
+        inconsistency = np.zeros(n_activities, dtype=np.int64)
+        variability = np.zeros(n_activities, dtype=np.int64)
+
+        def distinct_per_activity(present, values):
+            pairs = np.unique(activity_ids[present].astype(np.int64) * (values.max(initial=0) + 1) + values)
+            return np.bincount(pairs // (values.max(initial=0) + 1), minlength=n_activities)
+
+        # concept:name is present on every event and constant per activity
+        name_is_text = np.array([not name.isdigit() for name in log.activities], dtype=np.int64)
+        inconsistency += log.activity_counts() * name_is_text
+
+        present = log.timestamps != MISSING_TIMESTAMP
+        missing_data += np.bincount(activity_ids[~present], minlength=n_activities)
+        timestamps = log.timestamps[present]
+        if len(timestamps):
+            _, timestamp_codes = np.unique(timestamps, return_inverse=True)
+            variability += np.maximum(distinct_per_activity(present, timestamp_codes.ravel()) - 1, 0)
+
+        for attr in self.expected_attributes:
+            if attr not in ('concept:name', 'time:timestamp') and attr not in log.attributes:
+                missing_data += log.activity_counts()
+
+        for attr, (codes, values) in log.attributes.items():
+            present = codes >= 0
+            counts = np.bincount(activity_ids[present], minlength=n_activities)
+            if attr in self.expected_attributes:
+                missing_data += np.bincount(activity_ids[~present], minlength=n_activities)
+            else:
+                inconsistency += counts
+            is_text = np.array([isinstance(value, str) and not value.isdigit() for value in values], dtype=bool)
+            if is_text.any():
+                inconsistency += np.bincount(activity_ids[present & is_text[np.maximum(codes, 0)]], minlength=n_activities)
+            variability += np.maximum(distinct_per_activity(present, codes[present]) - 1, 0)
+
+        totals = missing_data + inconsistency + variability
+        return {log.activities[a]: int(totals[a]) for a in log.activities_in_order().tolist()}
 
     def estimate_event_probabilities(self):
-        event_counter = Counter(event['concept:name'] for trace in self.event_log for event in trace)
+        if self.variants is not None:
+            event_counter = self.variants.activity_counts()
+        else:
+            event_counter = Counter(event['concept:name'] for trace in self.event_log for event in trace)
         total_events = sum(event_counter.values())
         return {event: count / total_events for event, count in event_counter.items()}
 
     def quantify_uncertainty_factors(self):
-        uncertainty_factors = {}
-        event_names = set(event['concept:name'] for trace in self.event_log for event in trace)
-        for index, event_name in enumerate(event_names, start=1):
-            missing_data, inconsistency, variability = self.measure_missing_data(event_name)
-            total_uncertainty = missing_data + inconsistency + variability
-            uncertainty_factors[event_name] = total_uncertainty
-            # Progress bar update
-            self.print_progress(index, len(event_names), prefix='Quantifying Uncertainty Factors:')
-        return uncertainty_factors
-
-    def measure_missing_data(self, event_name):
-        missing_data_count = inconsistency_score = variability_score = 0
-        attribute_values = defaultdict(set)
+        # Single pass over the log accumulating the factors of all activities at once
+        partial = self.create_partial()
         for trace in self.event_log:
-            for event in trace:
-                if event['concept:name'] == event_name:
-                    missing_data_count += sum(1 for attr in self.expected_attributes if attr not in event)
-                    for attr, value in event.items():
-                        if attr not in self.expected_attributes:
-                            inconsistency_score += 1
-                        if isinstance(value, str) and not value.isdigit():
-                            inconsistency_score += 1
-                        attribute_values[attr].add(value)
-        for attr, values in attribute_values.items():
-            if len(values) > 1:
-                variability_score += len(values) - 1
-        return missing_data_count, inconsistency_score, variability_score
+            partial.update(trace)
+        metrics.progress("Uncertainty factors quantified.")
+        self.uncertainty_errors = partial.uncertainty_errors()
+        return partial.uncertainty_factors()
 
+    @metrics.timed('uncertainty_ic')
     def calculate(self):
         total_events = len(self.event_probabilities)
-        for index, (event_name, probability) in enumerate(self.event_probabilities.items(), start=1):
+        for event_name, probability in self.event_probabilities.items():
             uncertainty = self.uncertainty_factors.get(event_name, 0)
             self.IC_Uncertainty[event_name] = -math.log2(probability + uncertainty)
-            # Progress bar update
-            self.print_progress(index, total_events, prefix='Calculating IC:')
+            self.IC_error_bounds[event_name] = information_error_bound(
+                probability + uncertainty, 2 * self.uncertainty_errors.get(event_name, 0))
+        metrics.progress(f"Uncertainty IC calculated for {total_events} activities.")
         return self.IC_Uncertainty
 
-    def print_progress(self, iteration, total, prefix='', length=50, fill='█'):
-        percent = ("{0:.1f}").format(100 * (iteration / float(total)))
-        filledLength = int(length * iteration // total)
-        bar = fill * filledLength + '-' * (length - filledLength)
-        print(f'\r{prefix} |{bar}| {percent}% Complete', end='\r')
-        if iteration == total:
-            print()
+    def create_partial(self, invertible=False):
+        # Empty mergeable statistics matching this calculator's settings; invertible partials
+        # count values in multisets so that traces can be removed again
+        return UncertaintyPartial(self.expected_attributes, self.cardinality_precision, invertible)
+
+    @metrics.timed('uncertainty_ic')
+    def load_partial(self, partial):
+        # Replaces the calculator's statistics with those of a (merged) UncertaintyPartial
+        total_events = sum(partial.activity_counts.values())
+        self.event_probabilities = {event: count / total_events for event, count in partial.activity_counts.items()}
+        self.uncertainty_factors = partial.uncertainty_factors()
+        self.uncertainty_errors = partial.uncertainty_errors()
+        self.IC_Uncertainty = {}
+        self.IC_error_bounds = {}
+
+
+class ValueMultiset(Counter):
+    """Distinct-value counter that, unlike a set, supports removing one occurrence of a value."""
+
+    def add(self, value):
+        self[value] += 1
+
+    def discard(self, value):
+        self[value] -= 1
+        if self[value] <= 0:
+            del self[value]
+
+
+class UncertaintyPartial:
+    """Mergeable statistics of the uncertainty IC over a slice of the traces.
+
+    Holds, per activity, the missing-attribute count, the inconsistency score and
+    the distinct values of every attribute (sets, HyperLogLog sketches when
+    cardinality_precision is set, or multisets when invertible). merge is
+    associative. Instances are plain data and can be pickled.
+    """
+
+    def __init__(self, expected_attributes, cardinality_precision=None, invertible=False):
+        if invertible and cardinality_precision is not None:
+            raise ValueError("HyperLogLog distinct counts cannot be decremented")
+        self.expected_attributes = list(expected_attributes)
+        self.cardinality_precision = cardinality_precision
+        self.invertible = invertible
+        self.activity_counts = Counter()
+        self.missing_data = Counter()
+        self.inconsistency = Counter()
+        self.attribute_values = defaultdict(dict)
+
+    def new_value_counter(self):
+        if self.invertible:
+            return ValueMultiset()
+        if self.cardinality_precision is None:
+            return set()
+        return HyperLogLog(self.cardinality_precision)
+
+    def event_scores(self, event):
+        # (missing attribute count, inconsistency score) of one event
+        missing = sum(1 for attr in self.expected_attributes if attr not in event)
+        inconsistency = 0
+        for attr, value in event.items():
+            if attr not in self.expected_attributes:
+                inconsistency += 1
+            if isinstance(value, str) and not value.isdigit():
+                inconsistency += 1
+        return missing, inconsistency
+
+    def update(self, trace):
+        for event in trace:
+            event_name = event['concept:name']
+            missing, inconsistency = self.event_scores(event)
+            self.activity_counts[event_name] += 1
+            self.missing_data[event_name] += missing
+            self.inconsistency[event_name] += inconsistency
+            values_by_attr = self.attribute_values[event_name]
+            for attr, value in event.items():
+                values = values_by_attr.get(attr)
+                if values is None:
+                    values = values_by_attr[attr] = self.new_value_counter()
+                values.add(value)
+        return self
+
+    def remove(self, trace):
+        if not self.invertible:
+            raise ValueError("traces can only be removed from an invertible UncertaintyPartial")
+        for event in trace:
+            event_name = event['concept:name']
+            missing, inconsistency = self.event_scores(event)
+            self.missing_data[event_name] -= missing
+            self.inconsistency[event_name] -= inconsistency
+            values_by_attr = self.attribute_values[event_name]
+            for attr, value in event.items():
+                values_by_attr[attr].discard(value)
+                if not values_by_attr[attr]:
+                    del values_by_attr[attr]
+            self.activity_counts[event_name] -= 1
+            if self.activity_counts[event_name] <= 0:
+                for counter in (self.activity_counts, self.missing_data, self.inconsistency, self.attribute_values):
+                    del counter[event_name]
+        return self
+
+    def merge(self, other):
+        self.activity_counts.update(other.activity_counts)
+        self.missing_data.update(other.missing_data)
+        self.inconsistency.update(other.inconsistency)
+        for event_name, other_values in other.attribute_values.items():
+            values_by_attr = self.attribute_values[event_name]
+            for attr, values in other_values.items():
+                if attr not in values_by_attr:
+                    values_by_attr[attr] = self.new_value_counter()
+                mine = values_by_attr[attr]
+                if isinstance(mine, HyperLogLog):
+                    mine.merge(values)
+                else:
+                    mine.update(values)
+        return self
+
+    def uncertainty_factors(self):
+        factors = {}
+        for event_name, values_by_attr in self.attribute_values.items():
+            variability = sum(len(values) - 1 for values in values_by_attr.values() if len(values) > 1)
+            factors[event_name] = self.missing_data[event_name] + self.inconsistency[event_name] + variability
+        return factors
+
+    def uncertainty_errors(self):
+        # Standard error of every factor: the variability term is the only estimated part
+        errors = {}
+        for event_name, values_by_attr in self.attribute_values.items():
+            errors[event_name] = sum(values.relative_error * values.estimate() for values in values_by_attr.values()
+                                     if isinstance(values, HyperLogLog))
+        return errors
@@ -0,0 +1,89 @@
+from array import array
+from collections import Counter
+
+
+class VariantIndex:
+    """Index of the distinct activity sequences (trace variants) of an event log.
+
+    Each variant maps to the number of traces following it and to the ids of
+    those traces, ids being the positions of the traces in the log. Variants are
+    kept in order of first appearance, so iterating over them visits activities
+    in the same order as iterating over the log itself.
+
+    Attributes:
+        variants (dict): Activity sequence (tuple) to [count, array of trace ids].
+        n_traces (int): Number of traces indexed.
+    """
+
+    def __init__(self):
+        self.variants = {}
+        self.n_traces = 0
+
+    @classmethod
+    def from_traces(cls, traces):
+        """Build the index from traces of event dictionaries."""
+        index = cls()
+        for trace in traces:
+            index.add(trace)
+        return index
+
+    @classmethod
+    def from_columnar(cls, log):
+        """Build the index from a ColumnarEventLog."""
+        index = cls()
+        activities = log.activities
+        offsets = log.trace_offsets.tolist()
+        activity_ids = log.activity_ids
+        by_ids = {}
+        for trace_id, (start, end) in enumerate(zip(offsets, offsets[1:])):
+            key = activity_ids[start:end].tobytes()
+            sequence = by_ids.get(key)
+            if sequence is None:
+                sequence = by_ids[key] = tuple(activities[a] for a in activity_ids[start:end].tolist())
+            index.add_sequence(sequence, trace_id)
+        return index
+
+    def add(self, trace, trace_id=None):
+        """Add one trace of event dictionaries, by default with the next free trace id."""
+        self.add_sequence(tuple(event['concept:name'] for event in trace), trace_id)
+
+    def add_sequence(self, sequence, trace_id=None):
+        """Add one trace given as its activity sequence."""
+        if trace_id is None:
+            trace_id = self.n_traces
+        entry = self.variants.get(sequence)
+        if entry is None:
+            entry = self.variants[sequence] = [0, array('q')]
+        entry[0] += 1
+        entry[1].append(trace_id)
+        self.n_traces += 1
+
+    def __len__(self):
+        return len(self.variants)
+
+    def __iter__(self):
+        """Iterate over (activity sequence, count) pairs."""
+        for sequence, (count, _) in self.variants.items():
+            yield sequence, count
+
+    def count(self, sequence):
+        """Return the number of traces following a variant."""
+        entry = self.variants.get(tuple(sequence))
+        return entry[0] if entry else 0
+
+    def trace_ids(self, sequence):
+        """Return the ids of the traces following a variant."""
+        entry = self.variants.get(tuple(sequence))
+        return list(entry[1]) if entry else []
+
+    def activity_counts(self):
+        """Return the number of occurrences of every activity, weighted by variant counts."""
+        counts = Counter()
+        for sequence, count in self:
+            for activity in sequence:
+                counts[activity] += count
+        return counts
+
+    def n_events(self):
+        """Return the total number of events in the indexed traces."""
+        return sum(len(sequence) * count for sequence, count in self)
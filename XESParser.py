@@ -1,19 +1,66 @@
 import xml.etree.ElementTree as ET
 from dateutil import parser as date_parser
+from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import Counter, deque
+import bz2
+import gzip
+import io
+import lzma
 import os
+import re
+
+from Instrumentation import metrics
+from TraceSampling import TraceSampler
+from VariantIndex import VariantIndex
+
+TRACE_START_PATTERN = re.compile(rb"<(?:[\w.-]+:)?trace[\s>]")
+ROOT_TAG_PATTERN = re.compile(rb"<((?:[\w.-]+:)?log)[\s>]")
+COMPRESSED_OPENERS = {'.xes.gz': gzip.open, '.xes.bz2': bz2.open, '.xes.xz': lzma.open}
+XES_SUFFIXES = ('.xes',) + tuple(COMPRESSED_OPENERS)
 
 class XESParser:
     """Parser for XES formatted event logs.
 
     Attributes:
-        xes_dir_path (str): Directory path where XES files are located.
+        xes_dir_path (str): Directory path where XES files (plain, .gz, .bz2 or .xz) are located.
         activity_to_id (dict): Dictionary mapping activity names to unique identifiers.
+        log_headers (dict): Log-level extensions, globals, classifiers and attributes
+            seen by the most recent streaming parse.
+        attribute_keys (set): Event attribute keys to keep, or None to keep all of them.
+            'concept:name' and 'time:timestamp' are always kept.
+        value_decoders (dict): XES attribute type tag to value decoder.
+        cache (EventLogCache): Optional on-disk cache of parsed files.
+        parse_errors (dict): File path to the error that interrupted its parsing.
+        variant_index (VariantIndex): Distinct activity sequences of the traces returned by
+            the most recent process_all_xes_files, iter_all_xes_files or sample_all_xes_files call.
+        sampler (TraceSampler): Sampler used by the most recent sample_all_xes_files call.
     """
 
-    def __init__(self, xes_dir_path):
-        """Initialize the XESParser with the directory path of XES files."""
+    def __init__(self, xes_dir_path, attribute_keys=None, cache=None):
+        """Initialize the XESParser with the directory path of XES files.
+
+        Args:
+            xes_dir_path (str): Directory path where XES files are located.
+            attribute_keys (iterable): Event attribute keys needed by the caller. Every
+                other key is skipped at parse time. Defaults to keeping all keys.
+            cache (EventLogCache): Cache consulted by process_all_xes_files before parsing
+                a file, and filled with every file it parses.
+        """
         self.xes_dir_path = xes_dir_path
         self.activity_to_id = {}
+        self.attribute_keys = None if attribute_keys is None else set(attribute_keys) | {'concept:name', 'time:timestamp'}
+        self.value_decoders = {
+            'string': str,
+            'date': self.decode_date,
+            'int': self.decode_int,
+            'float': self.decode_float,
+            'boolean': self.decode_boolean,
+        }
+        self.log_headers = {'extensions': [], 'globals': {}, 'classifiers': [], 'attributes': {}}
+        self.cache = cache
+        self.parse_errors = {}
+        self.variant_index = VariantIndex()
 
     def parse_xes_event_log(self, xes_file_path, max_traces=100):
         """Parse a XES event log file.
@@ -27,37 +74,131 @@ class XESParser:
         """
         traces = []
         try:
-            print(f"Starting to parse the file: {xes_file_path}")
-            tree = ET.parse(xes_file_path)
+            metrics.progress(f"Starting to parse the file: {xes_file_path}")
+            with self.open_xes_file(xes_file_path) as source:
+                tree = ET.parse(source)
             root = tree.getroot()
             namespace = root.tag[root.tag.find("{"):root.tag.find("}")+1]
             processed_traces = 0
 
             for trace in root.findall(f"{namespace}trace"):
                 if processed_traces >= max_traces:
-                    print(f"Reached the limit of {max_traces} traces. Stopping.")
+                    metrics.progress(f"Reached the limit of {max_traces} traces. Stopping.")
                     break
-                events = []
-                for event in trace.findall(f"{namespace}event"):
-                    event_data = self.parse_event(event, namespace)
-                    if event_data:
-                        events.append(event_data)
+                events = self.parse_trace(trace, namespace)
                 if events:
                     traces.append(events)
                     processed_traces += 1
-                    if processed_traces % 10 == 0 or processed_traces == max_traces:
-                        print(f"Processed {processed_traces}/{max_traces} traces.")
+                    metrics.count('traces_parsed')
+                    metrics.count('events_parsed', len(events))
+                    metrics.progress(f"Processed {processed_traces}/{max_traces} traces.")
 
-            print(f"Finished parsing {xes_file_path}. Total traces processed: {processed_traces}.")
+            metrics.progress(f"Finished parsing {xes_file_path}. Total traces processed: {processed_traces}.")
         except ET.ParseError as e:
+            self.parse_errors[xes_file_path] = str(e)
             print(f"Parse Error: {e}")
         except Exception as e:
+            self.parse_errors[xes_file_path] = str(e)
             print(f"An unexpected error occurred: {e}")
         return traces
 
+    def iter_xes_traces(self, xes_file_path, max_traces=100):
+        """Stream traces from a XES event log file one at a time.
+
+        Unlike parse_xes_event_log, the file is never held in memory as a full
+        ElementTree: each <trace> element is parsed as soon as it is complete and
+        released straight after. Log-level <extension>, <global> and <classifier>
+        headers are recorded in log_headers rather than treated as traces.
+
+        Args:
+            xes_file_path (str): The file path of the XES file to be parsed.
+            max_traces (int): The maximum number of traces to yield from the log.
+
+        Yields:
+            list: A parsed trace, as a list of event dictionaries.
+        """
+        processed_traces = 0
+        try:
+            metrics.progress(f"Starting to stream the file: {xes_file_path}")
+            with self.open_xes_file(xes_file_path) as source:
+                for trace, namespace in self._iter_trace_elements(source):
+                    events = self.parse_trace(trace, namespace)
+                    if events:
+                        processed_traces += 1
+                        metrics.count('traces_parsed')
+                        metrics.count('events_parsed', len(events))
+                        metrics.progress(f"Processed {processed_traces}/{max_traces} traces.")
+                        yield events
+                    if processed_traces >= max_traces:
+                        metrics.progress(f"Reached the limit of {max_traces} traces. Stopping.")
+                        break
+            metrics.progress(f"Finished streaming {xes_file_path}. Total traces processed: {processed_traces}.")
+        except ET.ParseError as e:
+            self.parse_errors[xes_file_path] = str(e)
+            print(f"Parse Error: {e}")
+        except Exception as e:
+            self.parse_errors[xes_file_path] = str(e)
+            print(f"An unexpected error occurred: {e}")
+
+    def _iter_trace_elements(self, source):
+        """Yield (trace element, namespace) pairs from an open XES byte stream.
+
+        Only direct children of <log> are considered. Header elements are stored
+        in log_headers, and every finished child is detached from the root so
+        that at most one trace is alive at a time.
+        """
+        root = None
+        namespace = ""
+        depth = 0
+        self.log_headers = {'extensions': [], 'globals': {}, 'classifiers': [], 'attributes': {}}
+        for action, elem in ET.iterparse(source, events=('start', 'end')):
+            if action == 'start':
+                if root is None:
+                    root = elem
+                    namespace = root.tag[root.tag.find("{"):root.tag.find("}")+1]
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            tag = elem.tag[len(namespace):]
+            if tag == 'trace':
+                yield elem, namespace
+            elif tag == 'extension':
+                self.log_headers['extensions'].append(dict(elem.attrib))
+            elif tag == 'global':
+                scope = elem.get('scope', 'event')
+                self.log_headers['globals'][scope] = {attr.get('key'): attr.get('value') for attr in elem}
+            elif tag == 'classifier':
+                self.log_headers['classifiers'].append(dict(elem.attrib))
+            elif elem.get('key') is not None:
+                self.log_headers['attributes'][elem.get('key')] = elem.get('value')
+            root.remove(elem)
+
+    def parse_trace(self, trace, namespace):
+        """Parse the events of a single trace element.
+
+        Args:
+            trace (xml.etree.ElementTree.Element): The XML element representing the trace.
+            namespace (str): The XML namespace extracted from the log.
+
+        Returns:
+            list: The parsed event dictionaries of the trace.
+        """
+        events = []
+        for event in trace.findall(f"{namespace}event"):
+            event_data = self.parse_event(event, namespace)
+            if event_data:
+                events.append(event_data)
+        return events
+
     def parse_event(self, event, namespace):
         """Parse an event from the XES log.
 
+        The attribute children are walked once. Keys outside attribute_keys are
+        skipped without being decoded, and string, date, int, float and boolean
+        values are converted to their native Python types.
+
         Args:
             event (xml.etree.ElementTree.Element): The XML element representing the event.
             namespace (str): The XML namespace extracted from the log.
@@ -66,70 +207,364 @@ class XESParser:
             dict: A dictionary of the parsed event data, or None if required attributes are missing.
         """
         event_data = {}
-        concept_name = event.find(f"{namespace}string[@key='concept:name']")
-        timestamp = event.find(f"{namespace}date[@key='time:timestamp']")
-
-        if concept_name is not None and timestamp is not None:
-            activity_name = concept_name.get('value')
-            activity_timestamp = timestamp.get('value')
-            timestamp_obj = date_parser.parse(activity_timestamp)
-
-            event_data['concept:name'] = activity_name
-            event_data['time:timestamp'] = timestamp_obj
-
-            lifecycle_transition = event.find(f"{namespace}string[@key='lifecycle:transition']")
-            if lifecycle_transition is not None:
-                event_data['lifecycle:transition'] = lifecycle_transition.get('value')
-
-            resource = event.find(f"{namespace}string[@key='org:resource']")
-            if resource is not None:
-                event_data['org:resource'] = resource.get('value')
-
-            role = event.find(f"{namespace}string[@key='org:role']")
-            if role is not None:
-                event_data['org:role'] = role.get('value')
-
-            group = event.find(f"{namespace}string[@key='org:group']")
-            if group is not None:
-                event_data['org:group'] = group.get('value')
-
-            for attr in event:
-                key = attr.get('key')
-                if key not in event_data:
-                    value = attr.get('value')
-                    if attr.tag == f"{namespace}string":
-                        event_data[key] = value
-                    elif attr.tag == f"{namespace}date":
-                        event_data[key] = date_parser.parse(value)
+        attribute_keys = self.attribute_keys
+        prefix_length = len(namespace)
+
+        for attr in event:
+            key = attr.get('key')
+            if key in event_data or (attribute_keys is not None and key not in attribute_keys):
+                continue
+            decoder = self.value_decoders.get(attr.tag[prefix_length:])
+            if decoder is not None:
+                event_data[key] = decoder(attr.get('value'))
 
+        if 'concept:name' in event_data and 'time:timestamp' in event_data:
             return event_data
         else:
-            print("Event missing name or timestamp")
+            metrics.count('events_missing_name_or_timestamp')
+            metrics.progress("Event missing name or timestamp")
             return None
 
+    @staticmethod
+    def decode_date(value):
+        """Decode a XES date, using the ISO-8601 fast path before falling back to dateutil."""
+        try:
+            if value.endswith('Z'):
+                return datetime.fromisoformat(value[:-1] + '+00:00')
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return date_parser.parse(value)
+
+    @staticmethod
+    def decode_int(value):
+        """Decode a XES int, keeping the raw string if it is malformed."""
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    @staticmethod
+    def decode_float(value):
+        """Decode a XES float, keeping the raw string if it is malformed."""
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+    @staticmethod
+    def decode_boolean(value):
+        """Decode a XES boolean."""
+        return value.strip().lower() == 'true'
+
 
-    def process_all_xes_files(self, max_traces=100):
+    def list_xes_files(self):
+        """List the XES files in the specified directory, sorted by name for a deterministic order."""
+        return sorted(f for f in os.listdir(self.xes_dir_path) if f.endswith(XES_SUFFIXES))
+
+    @staticmethod
+    def open_xes_file(xes_file_path):
+        """Open a XES file as a binary stream, decompressing .gz, .bz2 and .xz files on the fly.
+
+        Compressed files are decoded incrementally as the XML parser reads from the
+        stream, so no decompressed copy is ever written to disk or held in memory.
+        """
+        for suffix, opener in COMPRESSED_OPENERS.items():
+            if xes_file_path.endswith(suffix):
+                return opener(xes_file_path, 'rb')
+        return open(xes_file_path, 'rb')
+
+    def register_activities(self, trace):
+        """Assign identifiers to the trace's activities in order of first appearance."""
+        for event in trace:
+            activity = event['concept:name']
+            if activity not in self.activity_to_id:
+                self.activity_to_id[activity] = len(self.activity_to_id)
+
+    def process_all_xes_files(self, max_traces=100, workers=1, chunk_size=64 * 1024 * 1024):
         """Process all XES files in the specified directory.
 
         Args:
-            max_traces (int): The maximum number of traces to process across all files.
+            max_traces (int): The maximum number of traces to process across all files, or None for all.
+            workers (int): Number of worker processes. With more than one worker, files
+                (and byte ranges of files larger than chunk_size) are parsed concurrently.
+            chunk_size (int): Approximate size in bytes of the ranges large files are split into.
 
         Returns:
             list: A list of all traces processed from all files.
         """
+        if max_traces is None:
+            max_traces = float('inf')
+        with metrics.stage('parse'):
+            if workers > 1:
+                all_traces = self._process_all_xes_files_parallel(max_traces, workers, chunk_size)
+            else:
+                all_traces = []
+                for file_name in self.list_xes_files():
+                    if len(all_traces) >= max_traces:
+                        break
+                    file_path = os.path.join(self.xes_dir_path, file_name)
+                    file_traces = self.parse_cached(file_path, max_traces=max_traces - len(all_traces))
+                    all_traces.extend(file_traces)
+                    metrics.progress(f"File processed: {file_name}. Total traces collected: {len(all_traces)}")
+                    if len(all_traces) >= max_traces:
+                        metrics.progress(f"Reached the overall limit of {max_traces} traces. Stopping.")
+                        break
+            self.variant_index = VariantIndex()
+            for trace in all_traces:
+                self.register_activities(trace)
+                self.variant_index.add(trace)
+        return all_traces
+
+    def sample_all_xes_files(self, sample_size=100, stratify_by=None, seed=None, coverage=False):
+        """Draw a fixed-size random sample of the traces of all XES files in one streaming pass.
+
+        Unlike process_all_xes_files, which keeps the first max_traces traces in
+        directory order, every trace of every file has a chance to be sampled, so
+        the sample is not biased towards the files listed first.
+
+        Args:
+            sample_size (int): Number of traces to sample.
+            stratify_by (str or callable): None for a plain reservoir sample, 'variant' or
+                'file' to allocate the sample proportionally over trace variants or source
+                files, or a function of (trace, file name) returning the stratum.
+            seed (int): Seed of the random priorities, for reproducible samples.
+            coverage (bool): Give every stratum at least one trace; the sample is then not
+                self-weighting and should not be used to estimate IC values.
+
+        Returns:
+            list: The sampled traces, in log order. The sampler, with the stratum sizes
+                needed for confidence intervals, is kept in self.sampler.
+        """
+        with metrics.stage('parse'):
+            self.sampler = TraceSampler(sample_size, stratify_by, seed, coverage)
+            for file_name in self.list_xes_files():
+                file_path = os.path.join(self.xes_dir_path, file_name)
+                self.sampler.add_traces(self.iter_xes_traces(file_path, max_traces=float('inf')), source=file_name)
+                metrics.progress(f"File processed: {file_name}. Total traces seen: {self.sampler.n_traces}")
+            sample = self.sampler.sample()
+            metrics.count('traces_sampled', len(sample))
+            self.variant_index = VariantIndex()
+            for trace in sample:
+                self.register_activities(trace)
+                self.variant_index.add(trace)
+        return sample
+
+    def parse_cached(self, xes_file_path, max_traces=100):
+        """Parse a XES file through the cache, when one is configured.
+
+        Args:
+            xes_file_path (str): The file path of the XES file to be parsed.
+            max_traces (int): The maximum number of traces to parse from the log.
+
+        Returns:
+            list: A list of parsed traces, where each trace is a list of event dictionaries.
+        """
+        # An error from an earlier parse of the file must not keep this one out of the cache
+        self.parse_errors.pop(xes_file_path, None)
+        if self.cache is None:
+            return self.parse_xes_event_log(xes_file_path, max_traces=max_traces)
+        traces = self.cache.load(xes_file_path, self.attribute_keys, max_traces)
+        if traces is not None:
+            metrics.count('traces_from_cache', len(traces))
+            metrics.progress(f"Loaded {len(traces)} traces of {xes_file_path} from the cache.")
+            return traces
+        traces = self.parse_xes_event_log(xes_file_path, max_traces=max_traces)
+        if xes_file_path not in self.parse_errors:
+            self.cache.store(xes_file_path, traces, self.attribute_keys, max_traces)
+        return traces
+
+    def _process_all_xes_files_parallel(self, max_traces, workers, chunk_size):
+        """Parse work units on a process pool and merge them in file and offset order.
+
+        Work units are submitted lazily, at most `workers` at a time. Results are
+        consumed strictly in unit order, so once the completed prefix holds
+        max_traces traces no further units are handed out and the merged log is
+        identical to the one produced sequentially. Files with a usable cache entry
+        are loaded in the parent process instead of being parsed, and freshly
+        parsed files are written back to the cache.
+        """
+        units = []
+        for file_name in self.list_xes_files():
+            file_path = os.path.join(self.xes_dir_path, file_name)
+            if self.cache is not None and self.cache.lookup(file_path, self.attribute_keys, max_traces):
+                units.append((file_path, None, None, None))
+            else:
+                units.extend(self.split_trace_ranges(file_path, chunk_size))
+        metrics.progress(f"Parsing {len(units)} work units on {workers} worker processes.")
+
         all_traces = []
-        xes_files = [f for f in os.listdir(self.xes_dir_path) if f.endswith('.xes')]
-        
-        for file_name in xes_files:
-            if len(all_traces) >= max_traces:
+        file_traces = {}
+        pending = deque()
+        next_unit = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while len(all_traces) < max_traces and (pending or next_unit < len(units)):
+                while next_unit < len(units) and len(pending) < workers:
+                    unit = units[next_unit]
+                    budget = max_traces - len(all_traces)
+                    if unit[1] is None:
+                        future = Future()
+                        future.set_result((self.parse_cached(unit[0], max_traces=budget), False))
+                    else:
+                        future = executor.submit(_parse_work_unit, self.xes_dir_path, self.attribute_keys,
+                                                 unit, budget)
+                    pending.append((unit, budget, future))
+                    next_unit += 1
+                unit, budget, future = pending.popleft()
+                traces, failed = future.result()
+                all_traces.extend(traces)
+                if unit[1] is not None:
+                    # Worker processes count into their own metrics, so their traces are counted here
+                    metrics.count('traces_parsed', len(traces))
+                    metrics.count('events_parsed', sum(len(trace) for trace in traces))
+                    merged = file_traces.setdefault(unit[0], {'traces': [], 'units': 0, 'truncated': False, 'failed': False})
+                    merged['traces'].extend(traces)
+                    merged['units'] += 1
+                    merged['truncated'] |= len(traces) >= budget
+                    merged['failed'] |= failed
+                metrics.progress(f"Work units merged: {next_unit - len(pending)}/{len(units)}. Total traces collected: {len(all_traces)}")
+            for _, _, future in pending:
+                future.cancel()
+        if len(all_traces) >= max_traces:
+            metrics.progress(f"Reached the overall limit of {max_traces} traces. Stopping.")
+
+        if self.cache is not None:
+            unit_counts = Counter(unit[0] for unit in units)
+            for file_path, merged in file_traces.items():
+                if merged['failed']:
+                    continue
+                exhausted = merged['units'] == unit_counts[file_path] and not merged['truncated']
+                budget = float('inf') if exhausted else len(merged['traces'])
+                self.cache.store(file_path, merged['traces'], self.attribute_keys, budget)
+        # max_traces is float('inf') for a whole-log parse, which cannot be a slice bound
+        return all_traces[:max_traces] if len(all_traces) > max_traces else all_traces
+
+    def split_trace_ranges(self, xes_file_path, chunk_size):
+        """Split a XES file into byte ranges that start on <trace> boundaries.
+
+        Args:
+            xes_file_path (str): The file path of the XES file to be split.
+            chunk_size (int): Approximate size in bytes of each range.
+
+        Returns:
+            list: (file path, start, end, header end) tuples covering the whole file.
+                The header end is the offset of the first trace; the bytes before it
+                are prepended to every range but the first. Compressed files cannot be
+                seeked into and are always returned as a single range.
+        """
+        file_size = os.path.getsize(xes_file_path)
+        if xes_file_path.endswith(tuple(COMPRESSED_OPENERS)):
+            return [(xes_file_path, 0, file_size, 0)]
+        with open(xes_file_path, 'rb') as source:
+            header_end = self._find_trace_start(source, 0)
+            if header_end is None or file_size <= chunk_size:
+                return [(xes_file_path, 0, file_size, header_end or 0)]
+            boundaries = [0]
+            position = header_end + chunk_size
+            while position < file_size:
+                boundary = self._find_trace_start(source, position)
+                if boundary is None:
+                    break
+                boundaries.append(boundary)
+                position = boundary + chunk_size
+        ends = boundaries[1:] + [file_size]
+        return [(xes_file_path, start, end, header_end) for start, end in zip(boundaries, ends)]
+
+    @staticmethod
+    def _find_trace_start(source, position, block_size=1024 * 1024):
+        """Return the offset of the first <trace> tag at or after position, or None."""
+        source.seek(position)
+        carry = b""
+        offset = position
+        while True:
+            block = source.read(block_size)
+            if not block:
+                return None
+            data = carry + block
+            match = TRACE_START_PATTERN.search(data)
+            if match:
+                return offset - len(carry) + match.start()
+            carry = data[-64:]
+            offset += len(block)
+
+    def parse_xes_byte_range(self, xes_file_path, start, end, header_end, max_traces=100):
+        """Parse the traces within a byte range produced by split_trace_ranges.
+
+        The log header is prepended and the root element closed as needed, so that
+        the range can be parsed as a standalone document.
+
+        Args:
+            xes_file_path (str): The file path of the XES file.
+            start (int): Offset of the first byte of the range.
+            end (int): Offset one past the last byte of the range.
+            header_end (int): Offset of the first trace in the file.
+            max_traces (int): The maximum number of traces to parse from the range.
+
+        Returns:
+            list: A list of parsed traces, where each trace is a list of event dictionaries.
+        """
+        traces = []
+        try:
+            if start == 0 and end == os.path.getsize(xes_file_path):
+                with self.open_xes_file(xes_file_path) as source:
+                    self._collect_traces(source, traces, max_traces)
+                return traces
+            with open(xes_file_path, 'rb') as source:
+                header = source.read(header_end)
+                source.seek(start)
+                body = source.read(end - start)
+                file_size = source.seek(0, os.SEEK_END)
+            document = body if start == 0 else header + body
+            if end < file_size:
+                root_tag = ROOT_TAG_PATTERN.search(header)
+                document += b"</" + (root_tag.group(1) if root_tag else b"log") + b">"
+            self._collect_traces(io.BytesIO(document), traces, max_traces)
+        except ET.ParseError as e:
+            self.parse_errors[xes_file_path] = str(e)
+            print(f"Parse Error in {xes_file_path} [{start}:{end}]: {e}")
+        return traces
+
+    def _collect_traces(self, source, traces, max_traces):
+        """Append up to max_traces parsed traces from a binary XES stream to traces."""
+        for trace, namespace in self._iter_trace_elements(source):
+            events = self.parse_trace(trace, namespace)
+            if events:
+                traces.append(events)
+                metrics.count('traces_parsed')
+                metrics.count('events_parsed', len(events))
+                if len(traces) >= max_traces:
+                    break
+
+    def iter_all_xes_files(self, max_traces=100):
+        """Stream traces from all XES files in the specified directory.
+
+        Streaming counterpart of process_all_xes_files: traces are yielded one at
+        a time and parsing stops as soon as max_traces have been consumed.
+
+        Args:
+            max_traces (int): The maximum number of traces to yield across all files.
+
+        Yields:
+            list: A parsed trace, as a list of event dictionaries.
+        """
+        yielded = 0
+        self.variant_index = VariantIndex()
+        for file_name in self.list_xes_files():
+            if yielded >= max_traces:
                 break
             file_path = os.path.join(self.xes_dir_path, file_name)
-            file_traces = self.parse_xes_event_log(file_path, max_traces=max_traces - len(all_traces))
-            all_traces.extend(file_traces)
-            print(f"File processed: {file_name}. Total traces collected: {len(all_traces)}")
-            if len(all_traces) >= max_traces:
-                print(f"Reached the overall limit of {max_traces} traces. Stopping.")
+            for trace in self.iter_xes_traces(file_path, max_traces=max_traces - yielded):
+                self.register_activities(trace)
+                self.variant_index.add(trace)
+                yielded += 1
+                yield trace
+            metrics.progress(f"File processed: {file_name}. Total traces collected: {yielded}")
+            if yielded >= max_traces:
+                metrics.progress(f"Reached the overall limit of {max_traces} traces. Stopping.")
                 break
-        return all_traces
 
 
+def _parse_work_unit(xes_dir_path, attribute_keys, unit, max_traces):
+    """Parse one (file path, start, end, header end) work unit in a worker process."""
+    parser = XESParser(xes_dir_path, attribute_keys=attribute_keys)
+    traces = parser.parse_xes_byte_range(*unit, max_traces=max_traces)
+    return traces, bool(parser.parse_errors)
@@ -0,0 +1,68 @@
+import random
+
+from MultiDimensionalInformationContent import MultiDimICCalculator, MultiDimPartial
+
+
+def random_log(n_traces, seed=0):
+    rng = random.Random(seed)
+    activities = 'ABCDEFGHIJ'
+    return [[{'concept:name': rng.choice(activities[:rng.randint(3, 10)])} for _ in range(rng.randint(1, 8))]
+            for _ in range(n_traces)]
+
+
+def test_windowed_combination_supports_match_mining():
+    log = random_log(1500)
+    for max_order, min_support in ((2, 1), (3, 20), (4, 0.05)):
+        tracked, plain = MultiDimPartial(max_order=max_order), MultiDimPartial()
+        for position, trace in enumerate(log):
+            tracked.update(trace)
+            plain.update(trace)
+            if position >= 300:
+                tracked.remove(log[position - 300])
+                plain.remove(log[position - 300])
+            if position % 97 == 0:
+                incremental = MultiDimICCalculator(None, max_order, min_support)
+                incremental.load_partial(tracked)
+                mined = MultiDimICCalculator(None, max_order, min_support)
+                mined.load_partial(plain)
+                assert incremental.combination_frequency == mined.combination_frequency
+
+
+def test_tracked_combinations_stay_near_the_frequent_ones():
+    partial = MultiDimPartial(max_order=5)
+    for trace in random_log(2000, seed=1):
+        partial.update(trace)
+    frequent = partial.frequent_combinations(400)
+    assert frequent
+    assert len(partial.combination_counts) < 4 * len(frequent) + 45
+
+
+def test_merged_partials_match_mining():
+    log = random_log(600, seed=2)
+    left, right = MultiDimPartial(max_order=3), MultiDimPartial(max_order=3)
+    for trace in log[:300]:
+        left.update(trace)
+    for trace in log[300:]:
+        right.update(trace)
+    left.frequent_combinations(10)
+    right.frequent_combinations(10)
+    merged = MultiDimICCalculator(None, 3, 10)
+    merged.load_partial(left.merge(right))
+    mined = MultiDimICCalculator(log, 3, 10)
+    mined.calculate_frequencies()
+    assert merged.combination_frequency == mined.combination_frequency
+
+
+def test_approximate_information_content_lies_within_its_bounds():
+    rng = random.Random(5)
+    log = [[{'concept:name': str(int(rng.paretovariate(0.8)) % 300)} for _ in range(rng.randint(2, 9))]
+           for _ in range(3000)]
+    exact = MultiDimICCalculator(log, max_order=3, min_support=5)
+    exact.calculate()
+    for width, capacity in ((64, 1000), (256, 20)):
+        approximate = MultiDimICCalculator(log, max_order=3, min_support=5, approximate=True, sketch_width=width,
+                                           heavy_hitters=capacity)
+        approximate.calculate()
+        for key, value in approximate.IC_MultiDim.items():
+            if key in exact.IC_MultiDim:
+                assert abs(value - exact.IC_MultiDim[key]) <= approximate.IC_error_bounds[key] + 1e-9
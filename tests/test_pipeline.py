@@ -0,0 +1,35 @@
+import os
+
+from FusedICEngine import FusedICEngine
+from Instrumentation import metrics
+from Pipeline import Pipeline
+from SyntheticLogGenerator import generate_xes_log
+
+
+def test_run_parses_the_log_once(tmp_path):
+    generate_xes_log(os.path.join(str(tmp_path), 'log.xes'), n_traces=60, trace_length=5, n_activities=6,
+                     n_variants=8, seed=0)
+    for discovery in ('iic', 'directly_follows'):
+        metrics.reset()
+        pipeline = Pipeline(str(tmp_path), sample_size=None, discovery=discovery, cache_dir=None)
+        pipeline.run(conformance=True)
+        assert metrics.counters['traces_parsed'] == 60
+
+
+def test_threshold_change_reuses_the_cached_parse(tmp_path):
+    data_dir, cache_dir = str(tmp_path / 'data'), str(tmp_path / 'cache')
+    os.makedirs(data_dir)
+    generate_xes_log(os.path.join(data_dir, 'log.xes'), n_traces=60, trace_length=5, n_activities=6,
+                     n_variants=8, seed=0)
+    Pipeline(data_dir, discovery='directly_follows', cache_dir=cache_dir).run(conformance=True)
+    metrics.reset()
+    Pipeline(data_dir, discovery='directly_follows', dependency_threshold=0.7, cache_dir=cache_dir).run(conformance=True)
+    assert metrics.counters['traces_parsed'] == 0
+
+
+def test_attribute_keys_keep_the_keys_the_ic_dimensions_read(tmp_path):
+    generate_xes_log(os.path.join(str(tmp_path), 'log.xes'), n_traces=20, trace_length=5, n_attributes=4, seed=0)
+    pipeline = Pipeline(str(tmp_path), sample_size=None, attribute_keys=[], cache_dir=None)
+    kept = {key for trace in pipeline.traces() for event in trace for key in event}
+    assert {'concept:name', 'time:timestamp', 'lifecycle:transition', 'org:group'} <= kept
+    assert kept <= FusedICEngine(0.5).attribute_keys()
@@ -0,0 +1,39 @@
+from collections import Counter
+
+from TraceSampling import TraceSampler
+
+
+def file_traces(name, n_traces):
+    return [[{'concept:name': name, 'id': index}] for index in range(n_traces)]
+
+
+def test_stratified_sample_has_fixed_size_and_proportional_files():
+    sizes = {'a.xes': 3000, 'b.xes': 2000, 'c.xes': 500}
+    for seed in range(5):
+        sampler = TraceSampler(300, stratify_by='file', seed=seed)
+        for name, n_traces in sizes.items():
+            sampler.add_traces(file_traces(name, n_traces), source=name)
+        sample = sampler.sample()
+        assert len(sample) == min(300, sum(sizes.values()))
+        per_file = Counter(trace[0]['concept:name'] for trace in sample)
+        for name, n_traces in sizes.items():
+            assert abs(per_file[name] - 300 * n_traces / 5500) <= 1
+
+
+def test_small_log_is_kept_whole():
+    sampler = TraceSampler(300, stratify_by='file', seed=0)
+    sampler.add_traces(file_traces('a.xes', 120), source='a.xes')
+    sampler.add_traces(file_traces('b.xes', 80), source='b.xes')
+    assert len(sampler.sample()) == 200
+
+
+def test_late_file_traces_are_as_likely_to_be_sampled():
+    included = Counter()
+    runs = 400
+    for seed in range(runs):
+        sampler = TraceSampler(30, stratify_by='file', seed=seed)
+        sampler.add_traces(file_traces('a.xes', 300), source='a.xes')
+        sampler.add_traces(file_traces('b.xes', 200), source='b.xes')
+        included.update(trace[0]['concept:name'] for trace in sampler.sample())
+    assert abs(included['a.xes'] / (runs * 300) - 30 / 500) < 0.005
+    assert abs(included['b.xes'] / (runs * 200) - 30 / 500) < 0.005
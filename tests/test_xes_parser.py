@@ -0,0 +1,30 @@
+import os
+
+from SyntheticLogGenerator import generate_xes_log
+from XESParser import XESParser
+
+
+def write_logs(directory, sizes):
+    for index, n_traces in enumerate(sizes):
+        generate_xes_log(os.path.join(directory, f'log{index}.xes'), n_traces=n_traces, trace_length=5,
+                         n_activities=6, n_variants=10, seed=index)
+
+
+def activity_sequences(traces):
+    return [[event['concept:name'] for event in trace] for trace in traces]
+
+
+def test_parallel_parse_of_whole_log_matches_sequential(tmp_path):
+    write_logs(str(tmp_path), [40, 25])
+    sequential = XESParser(str(tmp_path)).process_all_xes_files(max_traces=None)
+    parallel = XESParser(str(tmp_path)).process_all_xes_files(max_traces=None, workers=2, chunk_size=1024)
+    assert len(sequential) == 65
+    assert activity_sequences(parallel) == activity_sequences(sequential)
+
+
+def test_parallel_parse_stops_at_max_traces(tmp_path):
+    write_logs(str(tmp_path), [40, 25])
+    parallel = XESParser(str(tmp_path)).process_all_xes_files(max_traces=50, workers=2, chunk_size=1024)
+    sequential = XESParser(str(tmp_path)).process_all_xes_files(max_traces=50)
+    assert activity_sequences(parallel) == activity_sequences(sequential)
+    assert len(parallel) == 50